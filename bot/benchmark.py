@@ -0,0 +1,223 @@
+"""Offline benchmark for the image commands
+
+Runs `Images.save` and/or `Images.send` against a fake Discord context,
+without a Discord account. A local aiohttp server stands in for both
+the Discord CDN (serving the synthetic attachments) and `api_root`.
+
+Reports messages per second, attachment throughput, peak RSS and event
+loop lag, so changes to the download and forwarding paths can be compared.
+
+Run from the bot/ folder:
+    python benchmark.py --messages 200 --attachments 3 --size 512 --command save
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+from cogs.images import Images
+from cogs.utils.attachcache import AttachmentCache
+from cogs.utils.errorlog import ErrorLog
+from cogs.utils.metrics import Histogram, Metrics
+from cogs.utils.procinfo import format_mb, peak_rss_bytes
+from cogs.utils.sender import Sender
+
+SEND_ENDPOINT = "/api/v1/send_image"
+
+
+class FakeAttachment:
+    def __init__(self, id: int, url: str, size: int) -> None:
+        self.id = id
+        self.url = url
+        self.filename = url.rsplit("/", 1)[-1]
+        self.size = size
+
+
+class FakeContext:
+    """Just enough of `commands.Context` for the image commands"""
+
+    def __init__(self, message_id: int, attachments: list) -> None:
+        self.message = SimpleNamespace(
+            id=message_id, attachments=attachments, content="benchmark"
+        )
+        self.author = SimpleNamespace(id=0, name="bench", discriminator="0000")
+        self.sent = 0
+
+    async def trigger_typing(self):
+        pass
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+class FakeClient:
+    """Stand-in for `Levi` with the attributes the image cog uses"""
+
+    def __init__(self, config: dict, session: ClientSession) -> None:
+        self.config = config
+        self.session = session
+        self.metrics = Metrics()
+        self.last_errors = ErrorLog(overflow_file=None)
+        self.sender = Sender()
+        self.attachments = AttachmentCache(
+            tempfile.mkdtemp(prefix="levi-bench-cache-")
+        )
+
+    def user_is_admin(self, user):
+        return True
+
+    async def log_error(self, error, error_source=None):
+        self.last_errors.add(error, str(error_source))
+
+
+def make_stub_app(payload: bytes) -> web.Application:
+    """Local stand-in for the Discord CDN and the display server API"""
+
+    async def attachment(request):
+        return web.Response(body=payload, content_type="image/png")
+
+    async def send_image(request):
+        content = await request.json()
+        return web.json_response({"received": True, "url": content["url"]})
+
+    app = web.Application()
+    app.router.add_get("/attachments/{channel}/{id}/{name}", attachment)
+    app.router.add_post(SEND_ENDPOINT, send_image)
+    app.router.add_post("/{target}" + SEND_ENDPOINT, send_image)
+    return app
+
+
+async def measure_loop_lag(hist: Histogram, interval: float = 0.01):
+    """Record how late the event loop wakes up a task that sleeps `interval`"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        hist.observe(loop.time() - start - interval)
+
+
+async def run(args) -> dict:
+    payload = os.urandom(args.size * 1024)
+    runner = web.AppRunner(make_stub_app(payload))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    base = f"http://127.0.0.1:{args.port}"
+
+    save_dir = args.save_dir or tempfile.mkdtemp(prefix="levi-bench-")
+    config = {
+        "save_dir": save_dir,
+        "api_root": base,
+        "api_send_endpoint": SEND_ENDPOINT,
+    }
+    if args.targets > 1:
+        config["targets"] = [
+            {"name": f"frame{i}", "api_root": f"{base}/frame{i}"}
+            for i in range(args.targets)
+        ]
+    commands = ["save", "send"] if args.command == "both" else [args.command]
+
+    lag = Histogram()
+    async with ClientSession(timeout=ClientTimeout(total=30)) as session:
+        client = FakeClient(config, session)
+        cog = Images(client)
+        contexts = []
+        for m in range(args.messages):
+            attachments = []
+            for a in range(args.attachments):
+                attachment_id = m * 100 + a
+                url = f"{base}/attachments/1/{attachment_id}/img{a}.png"
+                attachments.append(FakeAttachment(attachment_id, url, len(payload)))
+            contexts.append(FakeContext(m, attachments))
+        guard = asyncio.Semaphore(args.concurrency)
+
+        async def handle(ctx):
+            async with guard:
+                for name in commands:
+                    await getattr(cog, name).callback(cog, ctx)
+
+        lag_task = asyncio.create_task(measure_loop_lag(lag))
+        start = time.perf_counter()
+        if args.prefetch:
+            # As Levi.on_message does when the messages arrive
+            for ctx in contexts:
+                client.attachments.prefetch(session, ctx.message.attachments)
+        await asyncio.gather(*(handle(ctx) for ctx in contexts))
+        elapsed = time.perf_counter() - start
+        lag_task.cancel()
+
+    await runner.cleanup()
+    num_attachments = args.messages * args.attachments
+    return dict(
+        commands=commands,
+        messages=args.messages,
+        attachments=num_attachments,
+        elapsed=elapsed,
+        messages_per_second=args.messages / elapsed,
+        attachments_per_second=num_attachments / elapsed,
+        megabytes_per_second=num_attachments * len(payload) / elapsed / 1048576,
+        peak_rss=peak_rss_bytes(),
+        loop_lag_p50_ms=lag.percentile(50) * 1000,
+        loop_lag_p99_ms=lag.percentile(99) * 1000,
+        loop_lag_max_ms=lag.max * 1000,
+        errors=len(client.last_errors),
+        attachment_cache=client.attachments.stats(),
+        stages=client.metrics.summary(),
+        save_dir=save_dir,
+    )
+
+
+def print_report(result: dict):
+    print(f"Commands:        {', '.join(result['commands'])}")
+    print(
+        f"Messages:        {result['messages']} in {result['elapsed']:.2f}s"
+        f" ({result['messages_per_second']:.1f} msg/s)"
+    )
+    print(
+        f"Attachments:     {result['attachments']}"
+        f" ({result['attachments_per_second']:.1f}/s,"
+        f" {result['megabytes_per_second']:.1f} MB/s)"
+    )
+    print(f"Peak RSS:        {format_mb(result['peak_rss'])}")
+    print(
+        f"Event loop lag:  p50 {result['loop_lag_p50_ms']:.1f}ms,"
+        f" p99 {result['loop_lag_p99_ms']:.1f}ms, max {result['loop_lag_max_ms']:.1f}ms"
+    )
+    print(f"Errors:          {result['errors']}")
+    for row in result["stages"]:
+        print(
+            f"  {row['name']:<18} n={row['count']:<6} p50 {row['p50']:.1f}ms"
+            f"  p95 {row['p95']:.1f}ms  p99 {row['p99']:.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--attachments", type=int, default=1, help="per message")
+    parser.add_argument("--size", type=int, default=256, help="attachment size in KiB")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--targets", type=int, default=1, help="display servers")
+    parser.add_argument("--command", choices=["save", "send", "both"], default="both")
+    parser.add_argument("--save-dir", help="defaults to a new temporary folder")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument(
+        "--prefetch", action="store_true", help="prefetch attachments on arrival"
+    )
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
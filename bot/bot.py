@@ -4,6 +4,13 @@ This file starts the bot and loads all extensions/cogs and configs/permissions
 The Bot automatically tries to load all extensions found in the "cogs/" folder
 plus the hangman.hangman extension.
 
+The "memory_profile" config key picks the client caches, see
+cogs/utils/memprofile.py. "lean" is meant for running on a small Pi.
+
+With "lazy_extensions" enabled in config.json, the extensions listed in
+cogs/manifest.json are not imported at startup. Their commands are registered
+as stubs, and the extension is loaded the first time one of them is used.
+
 An extension can be reloaded without restarting the bot.
 The extension "management" provides the commands to load/unload other extensions
 
@@ -12,18 +19,26 @@ This bot requires discord.py
 """
 import json
 import logging
-import os
 import sys
-import traceback
-from datetime import datetime
-from logging import handlers
+import time
 from pathlib import Path
 
-import discord
 from aiohttp import ClientSession, ClientTimeout
-from discord import AllowedMentions, DMChannel, User
+from discord import AllowedMentions, DMChannel, Message, User
 from discord.ext.commands import Bot, Context, when_mentioned_or
 
+from cogs.utils.attachcache import AttachmentCache
+from cogs.utils.errorlog import ErrorLog
+from cogs.utils.help import HelpCache
+from cogs.utils.lazy import LazyExtensions, startup_report
+from cogs.utils.logqueue import setup_logging
+from cogs.utils.memprofile import client_options
+from cogs.utils.metrics import Metrics
+from cogs.utils.reloader import ReloadPlanner
+from cogs.utils.sender import Sender
+
+log = logging.getLogger(__name__)
+
 
 class Levi(Bot):
     def __init__(self, *args, **options):
@@ -31,7 +46,19 @@ class Levi(Bot):
         self.session: ClientSession = None
         with open("config.json") as conffile:
             self.config: dict = json.load(conffile)
-        self.last_errors = []
+        self.last_errors = ErrorLog.from_config(self.config)
+        self.reload_planner = ReloadPlanner("cogs")
+        self.reload_planner.snapshot()
+        self.lazy_extensions = LazyExtensions(self, "cogs/manifest.json")
+        self.created_at = time.perf_counter()
+        self.load_time = 0.0
+        self.startup_report = None
+        self.metrics = Metrics()
+        self.help_cache = HelpCache()
+        self.attachments = AttachmentCache.from_config(self.config)
+        self.sender = Sender.from_config(self.config)
+        self.before_invoke(self.start_command_timer)
+        self.after_invoke(self.stop_command_timer)
 
     async def start(self, *args, **kwargs):
         self.session = ClientSession(timeout=ClientTimeout(total=30))
@@ -41,6 +68,20 @@ class Levi(Bot):
         await self.session.close()
         await super().close()
 
+    # The command list only changes with the extensions, so this is
+    # where the rendered help pages go stale
+    def load_extension(self, name):
+        self.help_cache.clear()
+        super().load_extension(name)
+
+    def unload_extension(self, name):
+        self.help_cache.clear()
+        super().unload_extension(name)
+
+    def reload_extension(self, name):
+        self.help_cache.clear()
+        super().reload_extension(name)
+
     def user_is_admin(self, user):
         return user.id in self.config["admins"]
 
@@ -48,95 +89,109 @@ class Levi(Bot):
         return user.id in self.config["superusers"]
 
     async def log_error(self, error: Exception, error_source: Context = None):
-        is_context = isinstance(error_source, Context)
-        has_attachment = bool(error_source.message.attachments) if is_context else False
-        self.last_errors.append(
-            (
-                error,
-                datetime.now(),
-                error_source,
-                error_source.message.content if is_context else None,
-                error_source.message.attachments[0] if has_attachment else None,
+        self.last_errors.add(error, error_source)
+        # Taken here on the loop thread, where add() runs too
+        pending = self.last_errors.take_pending()
+        if pending:
+            await self.loop.run_in_executor(None, self.last_errors.flush, pending)
+
+    async def start_command_timer(self, ctx: Context):
+        ctx.invoke_started = time.perf_counter()
+
+    async def stop_command_timer(self, ctx: Context):
+        # After-invoke hooks also run when the command raised an error
+        started = getattr(ctx, "invoke_started", None)
+        # A lazy stub's time is mostly the import of its extension, and
+        # the real command it dispatches to records its own sample
+        if getattr(ctx.command, "lazy_stub", False):
+            return
+        if started is not None:
+            self.metrics.observe(
+                f"cmd.{ctx.command.qualified_name}",
+                time.perf_counter() - started,
+                error=ctx.command_failed,
             )
-        )
-
-
-client = Levi(
-    command_prefix=when_mentioned_or(""),
-    description="Send n00ds",
-    max_messages=15000,
-    intents=discord.Intents(dm_messages=True),
-    allowed_mentions=AllowedMentions.none(),
-)
 
-STARTUP_EXTENSIONS = []
+    async def on_ready(self):
+        log.info("Active in these guilds/servers: %s", [g.name for g in self.guilds])
+        if self.startup_report is None:
+            ready_time = time.perf_counter() - self.created_at
+            self.startup_report = startup_report(self, self.load_time, ready_time)
+            log.info(self.startup_report)
+        log.info("Image Bot started successfully")
+        return True
+
+    async def on_error(self, event_method, *args, **kwargs):
+        """|coro|
+
+        The default error handler provided by the client, changed to log
+        the exception and store it in the error log.
+        Check :func:`~discord.on_error` for more details.
+        """
+        log.exception("Default Handler: Ignoring exception in %s", event_method)
+        # --------------- custom code below -------------------------------
+        await self.log_error(sys.exc_info()[1], "DEFAULT HANDLER:" + event_method)
+
+    async def on_message(self, msg: Message):
+        if isinstance(msg.channel, DMChannel):
+            if msg.attachments and self.user_is_admin(msg.author):
+                # Only admins can run the commands that use attachments
+                self.attachments.prefetch(self.session, msg.attachments)
+            await self.process_commands(msg)
+
+    async def on_message_edit(self, before: Message, after: Message):
+        # Discord also sends edits for embeds being added to a message,
+        # only an edited command should run again
+        if before.content == after.content:
+            return
+        if isinstance(after.channel, DMChannel):
+            await self.process_commands(after)
+
+
+def load_startup_extensions(client: Levi):
+    """Load every extension in cogs/, deferring the ones in the lazy manifest"""
+    start = time.perf_counter()
+    startup_extensions = []
+    for file in Path(Path(__file__).parent, "cogs/").iterdir():
+        filename, ext = file.stem, file.suffix
+        if ".py" in ext:
+            startup_extensions.append(f"cogs.{filename}")
+
+    if client.config.get("lazy_extensions", False):
+        deferred = client.lazy_extensions.install()
+        startup_extensions = [x for x in startup_extensions if x not in deferred]
+
+    for extension in reversed(startup_extensions):
+        try:
+            client.load_extension(f"{extension}")
+        except Exception as e:
+            client.last_errors.add(e, f"Loading {extension}")
+            exc = f"{type(e).__name__}: {e}"
+            log.error(f"Failed to load extension {extension}\n{exc}")
+    client.load_time = time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    # Cogs import this file as the `bot` module for the Levi class,
+    # so nothing below may run on import.
+    with open("config.json") as conffile:
+        config = json.load(conffile)
+    log_listener = setup_logging(
+        "../logs/discord.log", json_format=config.get("log_json", False)
+    )
 
-# for file in listdir(path.join(path.dirname(__file__), 'cogs/')):
-for file in Path(Path(__file__).parent, "cogs/").iterdir():
-    filename, ext = file.stem, file.suffix
-    if ".py" in ext:
-        STARTUP_EXTENSIONS.append(f"cogs.{filename}")
+    client = Levi(
+        command_prefix=when_mentioned_or(""),
+        description="Send n00ds",
+        allowed_mentions=AllowedMentions.none(),
+        **client_options(config),
+    )
+    load_startup_extensions(client)
+    log.info("STARTING BOT NOW")
 
-for extension in reversed(STARTUP_EXTENSIONS):
+    # Start the bot (blocking call)
     try:
-        client.load_extension(f"{extension}")
-    except Exception as e:
-        client.last_errors.append((e, datetime.utcnow(), None, None))
-        exc = f"{type(e).__name__}: {e}"
-        print(f"Failed to load extension {extension}\n{exc}")
-
-
-@client.event
-async def on_ready():
-    print("\nActive in these guilds/servers:")
-    [print(g.name) for g in client.guilds]
-    print("\nImage Bot started successfully")
-    return True
-
-
-@client.event
-async def on_error(event_method, *args, **kwargs):
-    """|coro|
-
-    The default error handler provided by the client.
-
-    By default this prints to :data:`sys.stderr` however it could be
-    overridden to have a different implementation.
-    Check :func:`~discord.on_error` for more details.
-    """
-    print(
-        "Default Handler: Ignoring exception in {}".format(event_method),
-        file=sys.stderr,
-    )
-    traceback.print_exc()
-    # --------------- custom code below -------------------------------
-    await client.log_error(sys.exc_info()[1], "DEFAULT HANDLER:" + event_method)
-
-
-@client.event
-async def on_message(msg):
-    if isinstance(msg.channel, DMChannel):
-        await client.process_commands(msg)
-
-
-# Setup logging
-log_filename = "../logs/discord.log"
-os.makedirs(os.path.dirname(log_filename), exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s:%(levelname)s:%(name)s: %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        handlers.RotatingFileHandler(
-            filename=log_filename,
-            encoding="utf-8",
-            maxBytes=(1048576),  # 1 MB max
-            backupCount=4,
-        ),
-    ],
-)
-logging.info("STARTING BOT NOW")
-
-# Start the bot (blocking call)
-client.run()
-print("Image Bot has exited")
+        client.run()
+    finally:
+        log.info("Image Bot has exited")
+        log_listener.stop()
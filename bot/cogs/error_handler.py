@@ -7,13 +7,18 @@ Commands:
 
 """
 # pylint: disable=E0402
-import traceback
+import io
+import logging
 import typing
 from datetime import datetime, timezone
 from asyncio import TimeoutError as AsyncTimeoutError
-from discord import Embed, DMChannel, errors as discord_errors
+from pathlib import PurePath
+from aiohttp import ClientError
+from discord import Embed, DMChannel, File, errors as discord_errors
 from discord.ext import commands
 
+log = logging.getLogger(__name__)
+
 
 class ErrorHandler(commands.Cog, name="ErrorHandler"):
     def __init__(self, client):
@@ -52,10 +57,9 @@ class ErrorHandler(commands.Cog, name="ErrorHandler"):
         await ctx.send(f"{usr} {error}")
         await self.client.log_error(error, ctx)
 
-        print(f"Ignoring exception in command `{ctx.command}``:", flush=True)
-        traceback.print_exception(type(error), error, error.__traceback__)
-        print(
-            "-------------------------------------------------------------", flush=True
+        log.error(
+            f"Ignoring exception in command `{ctx.command}`:",
+            exc_info=(type(error), error, error.__traceback__),
         )
 
     # ----------------------------------------------
@@ -74,32 +78,25 @@ class ErrorHandler(commands.Cog, name="ErrorHandler"):
             await self.print_traceback(ctx, n)
             return
 
-        NUM_ERRORS_PER_PAGE = 10
-
         error_log = self.client.last_errors
 
         if not error_log:
             await ctx.send("Error log is empty")
             return
 
-        response = [f"```css\nNumber of stored errors: {len(error_log)}"]
-        for i, exc_tuple in enumerate(error_log):
-            exc, date, error_source, *_ = exc_tuple
-            call_info = f'{"CMD:" + error_source.invoked_with if isinstance(error_source, commands.Context) else error_source}'
+        response = [f"Number of stored errors: {len(error_log)}"]
+        for i, record in enumerate(error_log):
+            repeats = f" (x{record.count})" if record.count > 1 else ""
             response.append(
                 f"{i}: ["
-                + date.isoformat().split(".")[0]
+                + record.last_seen.isoformat().split(".")[0]
                 + "] - ["
-                + call_info
-                + f"]\nException: {str(exc)[:200]}"
+                + str(record.source)
+                + f"]{repeats}\nException: {record.message[:200]}"
             )
-            if i % NUM_ERRORS_PER_PAGE == NUM_ERRORS_PER_PAGE - 1:
-                response.append("```")
-                await ctx.send("\n".join(response))
-                response = [f"```css"]
-        if len(response) > 1:
-            response.append("```")
-            await ctx.send("\n".join(response))
+        await self.client.sender.send(
+            ctx, "\n".join(response), lang="css", filename="errors.txt"
+        )
 
     @error.command(
         name="clear",
@@ -108,7 +105,7 @@ class ErrorHandler(commands.Cog, name="ErrorHandler"):
     async def error_clear(self, ctx, n: int = None):
         """Clear error with index [n]"""
         if n is None:
-            self.client.last_errors = []
+            self.client.last_errors.clear()
             await ctx.send("Error log cleared")
         else:
             self.client.last_errors.pop(n)
@@ -139,56 +136,63 @@ class ErrorHandler(commands.Cog, name="ErrorHandler"):
             await ctx.send("Error index does not exist")
             return
 
-        exc, date, error_source, orig_content, orig_attachment = error_log[n]
-        delta = (datetime.now(tz=timezone.utc) - date).total_seconds()
+        record = error_log[n]
+        delta = (datetime.now(tz=timezone.utc) - record.last_seen).total_seconds()
         hours = int(delta // 3600)
         seconds = int(delta - (hours * 3600))
         delta_str = f"{hours} hours and {seconds} seconds ago"
-        tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+        tb = record.traceback
         response_header = [f"`Error occured {delta_str}`"]
-        response_error = []
-
-        if isinstance(error_source, commands.Context):
-            guild = error_source.guild
-            channel = error_source.channel
+        if record.count > 1:
+            first = record.first_seen.isoformat().split(".")[0]
             response_header.append(
-                f"`Server:{guild.name} | Channel: {channel.name}`"
-                if guild
-                else "`In DMChannel`"
+                f"`Occured {record.count} times since {first} [{record.fingerprint}]`"
             )
+
+        if record.command is not None:
             response_header.append(
-                f"`User: {error_source.author.name}#{error_source.author.discriminator}`"
+                f"`Server:{record.guild_name} | Channel: {record.channel_name}`"
+                if record.guild_id
+                else "`In DMChannel`"
             )
-            response_header.append(f"`Command: {error_source.invoked_with}`")
-            response_header.append(error_source.message.jump_url)
+            response_header.append(f"`User: {record.author_name}`")
+            response_header.append(f"`Command: {record.command}`")
+            response_header.append(record.jump_url)
             e = Embed(
-                title="Full command that caused the error:", description=orig_content
+                title="Full command that caused the error:", description=record.content
             )
             e.set_footer(
-                text=error_source.author.display_name,
-                icon_url=error_source.author.avatar_url,
+                text=record.author_name,
+                icon_url=record.author_avatar,
             )
         else:
-            response_header.append(f"`Error caught in {error_source}`")
+            response_header.append(f"`Error caught in {record.source}`")
             e = None
 
-        for line in tb.split("\n"):
-            while len(line) > 1800:
-                response_error.append(line[:1800])
-                line = line[1800:]
-            response_error.append(line)
-
-        to_send = "\n".join(response_header) + "\n```python"
-
-        for line in response_error:
-            if len(to_send) + len(line) + 1 > 1800:
-                await ctx.send(to_send + "\n```")
-                to_send = "```python"
-            to_send += "\n" + line
-        await ctx.send(to_send + "\n```", embed=e)
+        await self.client.sender.send(
+            ctx,
+            tb,
+            lang="python",
+            header="\n".join(response_header),
+            embed=e,
+            filename="traceback.txt",
+        )
 
-        if orig_attachment:
-            await ctx.send("Attached file:", file=await orig_attachment.to_file())
+        if record.attachment_url:
+            try:
+                data = await self.client.attachments.get(
+                    self.client.session, record.attachment_id, record.attachment_url
+                )
+            except (ClientError, AsyncTimeoutError):
+                # Gone from the cache and from Discord, the link is all there is
+                await self.client.sender.send(
+                    ctx, f"Attached file: {record.attachment_url}"
+                )
+            else:
+                filename = PurePath(record.attachment_url).name.split("?")[0]
+                await self.client.sender.send(
+                    ctx, "Attached file:", files=[File(io.BytesIO(data), filename)]
+                )
 
     # @commands.command()
     # async def error_mock(self, ctx, n=1):
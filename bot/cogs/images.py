@@ -3,45 +3,66 @@ It will save an attached image to disk
 
 Commands:
     save       save image to disk
-    send       send attached image to api
+    send       send attached image to all display servers (see utils/delivery.py)
+    ls         list saved images, "ls sheet [page]" for a thumbnail contact sheet
+    search     search the messages of sent images, results as paged embeds
 
 Only users which are specified as a superuser in the config.json
 can run commands from this cog.
 """
 
+import asyncio
+import io
+import logging
 import time
 from inspect import Parameter
 from pathlib import Path, PurePath
-from typing import Iterable
+from typing import Iterable, Optional
 
 import aiofiles
+from aiohttp import ClientError
 from bot import Levi
-from discord.channel import DMChannel
-from discord.errors import HTTPException
+from discord import Embed, File
 from discord.ext import commands
 from discord.ext.commands.context import Context
-from discord.message import Attachment, Message
+from discord.message import Attachment
+
+from cogs.utils.contactsheet import ContactSheet
+from cogs.utils.delivery import FanOut, parse_topics
+
+log = logging.getLogger(__name__)
+
+SEARCH_ENDPOINT = "/api/v1/search"
+SEARCH_PER_PAGE = 10
 
 
 class Images(commands.Cog, name="Image"):
     def __init__(self, client: Levi):
         self.client = client
+        # Created on first use, the session doesn't exist at load time
+        self.fanout = None
+        self.contact_sheet = None
 
     async def cog_check(self, ctx: Context):
         return self.client.user_is_admin(ctx.author)
 
-    def get_attachment_urls(self, ctx: Context) -> Iterable[str]:
+    def get_attachments(self, ctx: Context) -> list:
         if len(images := ctx.message.attachments) == 0:
             raise commands.MissingRequiredArgument(
                 Parameter("attached_file", Parameter.POSITIONAL_ONLY, type=Attachment)
             )
-        return (image.url for image in images)
+        return images
+
+    def get_attachment_urls(self, ctx: Context) -> Iterable[str]:
+        return (image.url for image in self.get_attachments(ctx))
 
     @commands.command(name="save", description="Save an attachment to disk")
     async def save(self, ctx: Context):
         """Save an attachment"""
         await ctx.trigger_typing()
-        for i, url in enumerate(self.get_attachment_urls(ctx)):
+        saved = []
+        for i, attachment in enumerate(self.get_attachments(ctx)):
+            url = attachment.url
             output_file = Path(
                 self.client.config.get("save_dir"),
                 time.strftime("%Y-%m-%d-%H-%M-%S")
@@ -49,41 +70,139 @@ class Images(commands.Cog, name="Image"):
                 + PurePath(url).suffix,
             )
             output_file.parent.mkdir(parents=True, exist_ok=True)
-            async with self.client.session.get(url) as r:
-                if r.status == 200:
-                    async with aiofiles.open(
-                        output_file,
-                        mode="wb",
-                    ) as f:
-                        await f.write(await r.read())
-                else:
-                    self.client.log_error(HTTPException(r, "File Download Error"), ctx)
-            await ctx.send(f"File `{output_file.name}` saved")
-            print(str(output_file), "received")
+            metrics = self.client.metrics
+            try:
+                with metrics.timer("save.fetch"):
+                    # Usually prefetched when the message arrived
+                    data = await self.client.attachments.get(
+                        self.client.session, attachment.id, url
+                    )
+            except (ClientError, asyncio.TimeoutError) as e:
+                await self.client.log_error(e, ctx)
+                continue
+            with metrics.timer("save.write"):
+                async with aiofiles.open(
+                    output_file,
+                    mode="wb",
+                ) as f:
+                    await f.write(data)
+            saved.append(f"File `{output_file.name}` saved")
+            log.info("%s received", output_file)
+        if saved:
+            await self.client.sender.send(ctx, "\n".join(saved))
 
     @commands.command(name="send", description="Send attached image to Server")
     async def send(self, ctx: Context, *, message: str = None):
-        """Send an attached image (and text) to my API"""
-        config = self.client.config
-        api_endpoint = config["api_root"] + config["api_send_endpoint"]
+        """Send an attached image (and text) to my API
 
-        for url in self.get_attachment_urls(ctx):
-            body = {"url": url, "text": message}
-            async with self.client.session.post(api_endpoint, json=body) as r:
-                print(await r.json())
+        Hashtags in the text pick which display servers get the image.
+        """
+        if self.fanout is None:
+            self.fanout = FanOut.from_config(self.client.session, self.client.config)
+        topics = parse_topics(message)
+        metrics = self.client.metrics
+        response = []
+        bodies = [
+            {"url": url, "text": message} for url in self.get_attachment_urls(ctx)
+        ]
+        # Every image goes to every target at once, so an offline target
+        # retrying one image never holds up the next image for the others
+        with metrics.timer("send.post"):
+            deliveries = await asyncio.gather(
+                *(self.fanout.deliver(body, topics) for body in bodies)
+            )
+        for results in deliveries:
+            for result in results:
+                name = result.target.name
+                metrics.observe(f"send.target.{name}", result.latency, not result.ok)
+                if result.ok:
+                    response.append(f"{name} ({result.latency * 1000:.0f}ms)")
+                else:
+                    log.warning("Delivery to %s failed: %s", name, result.error)
+                    response.append(f"{name} FAILED ({result.error})")
+        if not response:
+            await ctx.send("No display server accepts these topics")
+            return
+        await ctx.send("Sent to: " + ", ".join(response))
+
+    @commands.command(name="search")
+    async def search(self, ctx: Context, page: Optional[int] = 1, *, query: str = ""):
+        """Search the messages of sent images, newest first
+
+        search [page] <words> [since:date] [until:date]
+        Words match as prefixes, dates can be partial, e.g. since:2021-07
+        """
+        config = self.client.config
+        # Without a single api_root, ask the first display server
+        api_root = config.get("api_root") or config["targets"][0]["api_root"]
+        url = api_root + SEARCH_ENDPOINT
+        params = {"q": query, "page": page, "per_page": SEARCH_PER_PAGE}
+        try:
+            with self.client.metrics.timer("search.query"):
+                async with self.client.session.get(url, params=params) as r:
+                    r.raise_for_status()
+                    result = await r.json()
+        except ClientError as e:
+            await ctx.send(f"Search failed: {type(e).__name__}: {e}")
+            return
+        if not result["data"]:
+            await ctx.send(f"No images found for `{query}`" if query else "No images")
+            return
+        embed = Embed(
+            title=f"Search: {query}" if query else "Latest images", color=0x2ECC71
+        )
+        embed.description = "\n".join(
+            f"`{image['date']}` [{image['message'] or 'no message'}]({image['url']})"
+            for image in result["data"]
+        )
+        embed.set_thumbnail(url=result["data"][0]["url"])
+        total = f"{result['total']}+" if result.get("more") else result["total"]
+        embed.set_footer(
+            text=f"Page {result['page']}/{result['pages']}, {total} images."
+            " Use search <page> <query> for more."
+        )
+        await self.client.sender.send(ctx, embed=embed)
 
     @commands.command(name="ls")
-    async def ls(self, ctx: Context):
+    async def ls(self, ctx: Context, mode: str = None, page: int = 1):
+        """List saved images, or "ls sheet [page]" for a thumbnail contact sheet"""
+        if mode == "sheet":
+            await self.send_contact_sheet(ctx, page)
+            return
         files = Path(self.client.config.get("save_dir")).iterdir()
-        response = ["\n-- images/\n"]
-        response += [f"  - {file}\n" for file in files]
-        await ctx.send(f'```css{"".join(response)}```')
+        response = ["-- images/"]
+        response += [f"  - {file}" for file in files if not file.name.startswith(".")]
+        await self.client.sender.send(
+            ctx, "\n".join(response), lang="css", filename="images.txt"
+        )
+
+    async def send_contact_sheet(self, ctx: Context, page: int):
+        await ctx.trigger_typing()
+        if self.contact_sheet is None:
+            conf = self.client.config.get("contact_sheet", {})
+            self.contact_sheet = ContactSheet(
+                self.client.config.get("save_dir"),
+                thumb_size=conf.get("thumb_size", 160),
+                columns=conf.get("columns", 5),
+                rows=conf.get("rows", 4),
+                max_workers=conf.get("workers", 2),
+                max_thumbs=conf.get("max_thumbs"),
+            )
+        with self.client.metrics.timer("ls.sheet"):
+            sheet = await self.contact_sheet.render(page)
+        if not sheet.files:
+            await ctx.send("No saved images")
+            return
+        await ctx.send(
+            f"Page {sheet.page}/{sheet.pages}:"
+            f" {sheet.files[0].name} ... {sheet.files[-1].name}",
+            file=File(io.BytesIO(sheet.image), filename=f"sheet-{sheet.page}.png"),
+        )
+
+    def cog_unload(self):
+        if self.contact_sheet is not None:
+            self.contact_sheet.close()
 
 
 def setup(client: Levi):
     client.add_cog(Images(client))
-
-    @client.event
-    async def on_message_edit(before: Message, after: Message):
-        if isinstance(after.channel, DMChannel):
-            await client.process_commands(after)
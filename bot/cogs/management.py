@@ -4,78 +4,168 @@ It will add some management commands to a bot.
 Commands:
     load            load an extension / cog
     unload          unload an extension / cog
-    reload          reload an extension / cog
+    reload          reload an extension / cog ("all" reloads only changed cogs)
+    autoreload      toggle reloading changed cogs automatically
     cogs            show currently active extensions / cogs
     version         show the hash of the latest commit
     pull            pull latest changes from github (superuser only)
 """
+import asyncio
 import json
 from bot import Levi
-import re
 import subprocess
+import time
 import typing
-from datetime import datetime
 from os import listdir, path
 
 from discord import Activity, File
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from cogs.utils.github import CommitHistory
+from cogs.utils.gitinfo import read_version
+from cogs.utils.proc import CommandRunner
 
 
 class Management(commands.Cog, name="Management"):
     def __init__(self, client: Levi):
         self.client = client
         self.reload_config()
-        self.cog_re = re.compile(r"\s*src\/cogs\/(.+)\.py\s*\|\s*\d+\s*[+-]+")
+        # Only one git command may touch the working tree at a time
+        self.git_runner = CommandRunner(max_concurrent=1, timeout=120)
+        self.version_info = None
+        self.planner = client.reload_planner
+        if self.planner.watch_channel is not None:
+            self.watch_cogs.change_interval(seconds=self.planner.watch_interval)
+            self.watch_cogs.start()
+
+    def cog_unload(self):
+        # stop() instead of cancel(), so a watcher iteration that is reloading
+        # this cog can still report back
+        self.watch_cogs.stop()
 
     async def cog_check(self, ctx):
         return self.client.user_is_admin(ctx.author)
 
-    def get_version_info(self):
-        version = "unknown"
-        date = "unknown"
+    async def get_version_info(self):
+        """Return (commit hash, commit date) of the running code
+
+        The result is cached until the next pull/reset. It is read from the
+        .git directory, and only falls back to `git log` when no commit hash
+        is found there. The date of a packed commit object is "unknown"
+        rather than worth starting a process for.
+        """
+        if self.version_info is not None:
+            return self.version_info
+        version, date = read_version()
+        if version is not None:
+            date = date or "unknown"
+        else:
+            try:
+                result = await self.git_runner.run(
+                    "git", "log", "-n", "1", "--format=%H %cI", timeout=10
+                )
+                version, date = result.output.split()
+            except Exception as e:
+                self.client.last_errors.add(e, "get_version_info")
+                raise e
+        self.version_info = (version, date)
+        return self.version_info
+
+    async def run_git(self, ctx, *args):
+        """Run a git command, streaming its output into a single message"""
+        if self.git_runner.busy:
+            await ctx.send("Waiting for another git command to finish...")
+        message = await ctx.send("```git\n...\n```")
+        lines = []
+        last_edit = time.monotonic()
+
+        def render():
+            output = "".join(lines)[-1900:] or "..."
+            return "```git\n" + output + "\n```"
+
+        async def on_output(line):
+            nonlocal last_edit
+            lines.append(line)
+            # Editing a message is rate limited, so only update once a second
+            if time.monotonic() - last_edit > 1:
+                last_edit = time.monotonic()
+                await message.edit(content=render())
+
         try:
-            gitlog = subprocess.check_output(
-                ["git", "log", "-n", "1", "--date=iso"]
-            ).decode()
-            for line in gitlog.split("\n"):
-                if line.startswith("commit"):
-                    version = line.split(" ")[1]
-                elif line.startswith("Date"):
-                    date = line[5:].strip()
-                    date = date.replace(" +", "+").replace(" ", "T")
-                else:
-                    pass
-        except Exception as e:
-            self.client.last_errors.append((e, datetime.utcnow(), None))
-            raise e
-        return (version, date)
+            result = await self.git_runner.run("git", *args, on_output=on_output)
+        finally:
+            await message.edit(content=render())
+            self.version_info = None
+            output = "".join(lines)
+            if len(output) > 1900:
+                # The message only shows the tail, attach the whole output
+                await self.client.sender.send(
+                    ctx, output, filename="git.txt", max_messages=0
+                )
+        return result
 
     async def get_remote_commits(self):
-        last_commit = self.get_version_info()[0]
-        ext = f"?per_page=10&sha=master"
-        repo = self.client.config["github_repo"]
-        auth_key = self.client.config.get("github_key")
-        header = None
-        if auth_key:
-            header = {"Authorization": f"token {auth_key}"}
-        nxt = f"https://api.github.com/repos/{repo}/commits{ext}"
-        repo_data = []
-        repo_shas = []
-        while last_commit not in repo_shas:
-            async with self.client.session.get(nxt, headers=header) as response:
-                r = await response.json()
-            repo_data += r
-            repo_shas = [x["sha"] for x in repo_data]
-            try:
-                nxt = r.links["next"]["url"]
-            except:
-                nxt = ""
-        num_comm = repo_shas.index(last_commit)
-        return (num_comm, repo_data[0 : (num_comm if num_comm > 10 else 10)])
+        last_commit = (await self.get_version_info())[0]
+        if self.commit_history is None:
+            self.commit_history = CommitHistory.from_config(
+                self.client.session, self.client.config
+            )
+        return await self.commit_history.commits_since(last_commit, min_count=10)
 
     def reload_config(self):
         with open("config.json") as conffile:
             self.client.config = json.load(conffile)
+        self.commit_history = None
+
+    async def reload_changed(self, force=False):
+        """Reload changed cogs and the cogs depending on them
+
+        Scanning and compiling run in an executor, only the imports themselves
+        run on the event loop. Returns a list of report lines with timings.
+        The watcher, "reload all" and "git pull" take turns, so an extension
+        is never reloaded twice for the same change.
+        """
+        async with self.planner.lock:
+            return await self._reload_changed(force)
+
+    async def _reload_changed(self, force):
+        loop = asyncio.get_running_loop()
+        plan = await loop.run_in_executor(
+            None, self.planner.prepare, list(self.client.extensions), force
+        )
+        result = []
+        failed = set(plan.errors)
+        for name, error in plan.errors.items():
+            await self.client.log_error(error, f"Compiling {name}")
+            result.append(f"#ERROR compiling [{name}]")
+
+        for name in plan.utilities:
+            start = time.perf_counter()
+            try:
+                self.planner.reload_utility(name)
+            except Exception as e:
+                await self.client.log_error(e, f"Reloading {name}")
+                result.append(f"#ERROR loading [{name}]")
+                failed.add(name)
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            result.append(f"Module [{name}] reloaded in {elapsed:.0f}ms.")
+
+        # Reload this cog last, so the rest of the plan still runs on the old code
+        for ext in sorted(plan.extensions, key=lambda x: x == __name__):
+            start = time.perf_counter()
+            try:
+                self.client.reload_extension(ext)
+            except Exception as e:
+                await self.client.log_error(e, f"Reloading {ext}")
+                result.append(f"#ERROR loading [{ext}]")
+                failed.add(ext)
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            result.append(f"Extension [{ext}] reloaded in {elapsed:.0f}ms.")
+
+        self.planner.mark_loaded(plan, [n for n in plan.changed if n not in failed])
+        return result
 
     def crawl_cogs(self, directory="cogs"):
         cogs = []
@@ -96,7 +186,10 @@ class Management(commands.Cog, name="Management"):
     @commands.Cog.listener()
     async def on_ready(self):
         loaded = self.client.extensions
-        unloaded = [x for x in self.crawl_cogs() if x not in loaded]
+        deferred = self.client.lazy_extensions.pending
+        unloaded = [
+            x for x in self.crawl_cogs() if x not in loaded and x not in deferred
+        ]
         # Cogs without extra in their name should be loaded at startup so if
         # any cog without "extra" in it's name is unloaded here -> Error in cog
         errors = [cog_name for cog_name in unloaded if "extra" not in cog_name]
@@ -104,7 +197,7 @@ class Management(commands.Cog, name="Management"):
             activity_name = f"ERROR in cogs {errors}"
             activity_type = 3
         else:
-            bot_version = self.get_version_info()[0][:7]
+            bot_version = (await self.get_version_info())[0][:7]
             activity_name = f"on {bot_version}"
             activity_type = 0
         await self.client.change_presence(
@@ -122,7 +215,7 @@ class Management(commands.Cog, name="Management"):
     )
     async def version(self, ctx):
         await ctx.trigger_typing()
-        version, date = self.get_version_info()
+        version, date = await self.get_version_info()
         num_commits, remote_data = await self.get_remote_commits()
         status = "I am up to date with 'origin/master'"
         changelog = "Changelog:\n"
@@ -140,9 +233,13 @@ class Management(commands.Cog, name="Management"):
                 + commitmessage.split("\n")[0]
                 + "\n"
             )
-        await ctx.send(
-            f"```css\nCurrent Version: [{version[:7]}].from [{date}]"
-            + f"\n{status}``````diff\n{changelog}```"
+        await self.client.sender.send(
+            ctx,
+            changelog,
+            lang="diff",
+            header=f"```css\nCurrent Version: [{version[:7]}].from [{date}]"
+            + f"\n{status}```",
+            filename="changelog.txt",
         )
 
     # ----------------------------------------------
@@ -159,12 +256,20 @@ class Management(commands.Cog, name="Management"):
             if extension_name in cog_name:
                 target_extension = cog_name
                 break
+        lazy = self.client.lazy_extensions
         try:
-            self.client.load_extension(target_extension)
+            if target_extension in lazy.pending:
+                # Replaces its stub commands, loading over them would fail
+                await lazy.load(target_extension)
+            else:
+                self.client.load_extension(target_extension)
         except Exception as e:
             await self.client.log_error(e, ctx)
             await ctx.send(f"```py\n{type(e).__name__}: {str(e)}\n```")
             return
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.planner.mark_current, target_extension
+        )
         await ctx.send(f"```css\nExtension [{target_extension}] loaded.```")
 
     # ----------------------------------------------
@@ -203,29 +308,66 @@ class Management(commands.Cog, name="Management"):
         aliases=["re"],
     )
     async def reload_extension(self, ctx, extension_name):
-        target_extensions = []
-        if extension_name == "all":
-            target_extensions = [__name__] + [
-                x for x in self.client.extensions if not x == __name__
-            ]
-        else:
-            for cog_name in self.client.extensions:
-                if extension_name in cog_name:
-                    target_extensions = [cog_name]
-                    break
-        if not target_extensions:
+        """Reload an extension, "all" for every changed one or "everything" """
+        if extension_name in ("all", "everything"):
+            await ctx.trigger_typing()
+            result = await self.reload_changed(force=extension_name == "everything")
+            result = "\n".join(result or ["No changes to reload."])
+            await self.client.sender.send(ctx, result, lang="css")
             return
-        result = []
-        for ext in target_extensions:
-            try:
-                self.client.reload_extension(ext)
-                result.append(f"Extension [{ext}] reloaded.")
-            except Exception as e:
-                await self.client.log_error(e, ctx)
-                result.append(f"#ERROR loading [{ext}]")
-                continue
-        result = "\n".join(result)
-        await ctx.send(f"```css\n{result}```")
+        target_extension = None
+        for cog_name in self.client.extensions:
+            if extension_name in cog_name:
+                target_extension = cog_name
+                break
+        if target_extension is None:
+            return
+        start = time.perf_counter()
+        try:
+            self.client.reload_extension(target_extension)
+        except Exception as e:
+            await self.client.log_error(e, ctx)
+            await ctx.send(f"```css\n#ERROR loading [{target_extension}]```")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.planner.mark_current, target_extension
+        )
+        await ctx.send(
+            f"```css\nExtension [{target_extension}] reloaded in {elapsed:.0f}ms.```"
+        )
+
+    # ----------------------------------------------
+    # Function to reload changed extensions automatically
+    # ----------------------------------------------
+    @commands.command(
+        name="autoreload",
+        brief="Toggle automatic reloading",
+        description="Watch the cogs folder and reload changed extensions",
+        hidden=True,
+    )
+    async def autoreload(self, ctx, seconds: float = 5.0):
+        if self.planner.watch_channel is not None:
+            self.planner.watch_channel = None
+            # cancel(), because a stopped task sleeps out its interval and
+            # start() would fail if autoreload is turned back on before that
+            self.watch_cogs.cancel()
+            await ctx.send("```css\nAutoreload [off]```")
+            return
+        self.planner.watch_channel = ctx.channel.id
+        self.planner.watch_interval = max(1.0, seconds)
+        self.watch_cogs.change_interval(seconds=self.planner.watch_interval)
+        self.watch_cogs.start()
+        interval = self.planner.watch_interval
+        await ctx.send(f"```css\nAutoreload [on], checking every {interval:g}s```")
+
+    @tasks.loop(seconds=5.0)
+    async def watch_cogs(self):
+        result = await self.reload_changed()
+        channel = self.client.get_channel(self.planner.watch_channel)
+        if result and channel is not None:
+            result = "\n".join(result)
+            await self.client.sender.send(channel, result, lang="css")
 
     # ----------------------------------------------
     # Function to get bot extensions
@@ -239,10 +381,14 @@ class Management(commands.Cog, name="Management"):
     )
     async def print_cogs(self, ctx):
         loaded = self.client.extensions
-        unloaded = [x for x in self.crawl_cogs() if x not in loaded]
-        response = ["\n[Loaded extensions]"] + ["\n  " + x for x in loaded]
-        response += ["\n[Unloaded extensions]"] + ["\n  " + x for x in unloaded]
-        await ctx.send(f'```css{"".join(response)}```')
+        deferred = self.client.lazy_extensions.pending
+        unloaded = [
+            x for x in self.crawl_cogs() if x not in loaded and x not in deferred
+        ]
+        response = ["[Loaded extensions]"] + ["  " + x for x in loaded]
+        response += ["[Deferred extensions]"] + ["  " + x for x in deferred]
+        response += ["[Unloaded extensions]"] + ["  " + x for x in unloaded]
+        await self.client.sender.send(ctx, "\n".join(response), lang="css")
         return True
 
     # ----------------------------------------------
@@ -263,19 +409,17 @@ class Management(commands.Cog, name="Management"):
         """Pull the latest changes from github"""
         await ctx.trigger_typing()
         try:
-            output = subprocess.check_output(["git", "pull"]).decode()
-            await ctx.send("```git\n" + output + "\n```")
-        except Exception as e:
+            await self.run_git(ctx, "pull")
+        except (subprocess.SubprocessError, OSError) as e:
             return await ctx.send(str(e))
 
         if noreload is not None:
             return
 
-        _cogs = [f"cogs.{i}" for i in self.cog_re.findall(output)]
-        active_cogs = [i for i in _cogs if i in self.client.extensions]
-        if active_cogs:
-            for cog_name in active_cogs:
-                await ctx.invoke(self.client.get_command("reload"), cog_name)
+        result = await self.reload_changed()
+        if result:
+            result = "\n".join(result)
+            await self.client.sender.send(ctx, result, lang="css")
 
     # ----------------------------------------------
     # Command to reset the repo to a previous commit
@@ -289,11 +433,8 @@ class Management(commands.Cog, name="Management"):
             raise commands.BadArgument("Please specify n>0")
         await ctx.trigger_typing()
         try:
-            output = subprocess.check_output(
-                ["git", "reset", "--hard", f"HEAD~{n}"]
-            ).decode()
-            await ctx.send("```git\n" + output + "\n```")
-        except Exception as e:
+            await self.run_git(ctx, "reset", "--hard", f"HEAD~{n}")
+        except (subprocess.SubprocessError, OSError) as e:
             await ctx.send(str(e))
 
     # ----------------------------------------------
@@ -0,0 +1,191 @@
+"""This is a cog for a discord.py bot.
+It profiles the running bot, without attaching anything to the container
+
+Commands:
+    profile
+      - cpu [seconds] [top]     cProfile the event loop thread for N seconds
+      - mem start [frames]      start tracing allocations with tracemalloc
+      - mem snap [top]          take a snapshot, diffed against the previous one
+      - mem stop                stop tracing allocations
+      - slow [ms]               toggle reporting callbacks that block the loop
+      - slow show               list recently reported slow callbacks
+
+Only users which are specified as an admin in the config.json
+can run commands from this cog.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from bot import Levi
+from discord import File
+from discord.ext import commands
+from discord.ext.commands.context import Context
+
+
+class SlowCallbackHandler(logging.Handler):
+    """Collect asyncio debug mode's "Executing <callback> took X seconds" warnings"""
+
+    def __init__(self, maxlen: int = 50) -> None:
+        super().__init__(level=logging.WARNING)
+        self.records = deque(maxlen=maxlen)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.getMessage().startswith("Executing"):
+            self.records.append((datetime.now(), record.getMessage()))
+
+
+class Profiler(commands.Cog, name="Profiler"):
+    def __init__(self, client: Levi):
+        self.client = client
+        self.cpu_lock = asyncio.Lock()
+        self.last_snapshot = None
+        self.slow_handler = None
+
+    def cog_unload(self):
+        self.disable_slow_callbacks()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    async def cog_check(self, ctx: Context):
+        return self.client.user_is_admin(ctx.author)
+
+    async def send_result(self, ctx: Context, text: str, filename: str, files=()):
+        """Send text inline if it fits in one message, otherwise as a file"""
+        await self.client.sender.send(
+            ctx, text, lang="", files=files, filename=filename, max_messages=1
+        )
+
+    @commands.group(name="profile", invoke_without_command=True, hidden=True)
+    async def profile(self, ctx: Context):
+        """Profile the running bot"""
+        await ctx.send_help(ctx.command)
+
+    # ----------------------------------------------
+    # CPU profiling
+    # ----------------------------------------------
+    @profile.command(name="cpu")
+    async def profile_cpu(self, ctx: Context, seconds: float = 10, top: int = 25):
+        """Profile the event loop for [seconds], show the [top] functions"""
+        if self.cpu_lock.locked():
+            await ctx.send("A CPU profile is already running")
+            return
+        async with self.cpu_lock:
+            await ctx.send(f"Profiling for {seconds:g} seconds...")
+            # Everything the event loop thread runs while we sleep is recorded
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(top)
+        raw = File(io.BytesIO(marshal.dumps(stats.stats)), filename="profile.prof")
+        await self.send_result(ctx, out.getvalue().strip(), "profile.txt", [raw])
+
+    # ----------------------------------------------
+    # Memory snapshots
+    # ----------------------------------------------
+    @profile.group(name="mem", invoke_without_command=True)
+    async def profile_mem(self, ctx: Context):
+        """Trace memory allocations with tracemalloc"""
+        state = "on" if tracemalloc.is_tracing() else "off"
+        await ctx.send(f"```css\ntracemalloc is [{state}]```")
+
+    @profile_mem.command(name="start")
+    async def mem_start(self, ctx: Context, frames: int = 1):
+        """Start tracing allocations, keeping [frames] frames per allocation"""
+        if tracemalloc.is_tracing():
+            await ctx.send("tracemalloc is already tracing")
+            return
+        tracemalloc.start(frames)
+        self.last_snapshot = tracemalloc.take_snapshot()
+        await ctx.send("tracemalloc started, baseline snapshot taken")
+
+    @profile_mem.command(name="snap", aliases=["snapshot", "compare"])
+    async def mem_snap(self, ctx: Context, top: int = 25):
+        """Take a snapshot and compare it to the previous one"""
+        if not tracemalloc.is_tracing():
+            await ctx.send("tracemalloc is not running, use `profile mem start`")
+            return
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced: {current / 1024:.0f}KiB (peak {peak / 1024:.0f}KiB)"]
+        if self.last_snapshot is not None:
+            lines.append(f"Top {top} differences since the previous snapshot:")
+            stats = snapshot.compare_to(self.last_snapshot, "lineno")
+        else:
+            lines.append(f"Top {top} allocations:")
+            stats = snapshot.statistics("lineno")
+        lines += [str(stat) for stat in stats[:top]]
+        self.last_snapshot = snapshot
+        await self.send_result(ctx, "\n".join(lines), "tracemalloc.txt")
+
+    @profile_mem.command(name="stop")
+    async def mem_stop(self, ctx: Context):
+        """Stop tracing allocations"""
+        tracemalloc.stop()
+        self.last_snapshot = None
+        await ctx.send("tracemalloc stopped")
+
+    # ----------------------------------------------
+    # Slow callback detection
+    # ----------------------------------------------
+    def enable_slow_callbacks(self, threshold: float):
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = threshold
+        loop.set_debug(True)
+        if self.slow_handler is None:
+            self.slow_handler = SlowCallbackHandler()
+            logging.getLogger("asyncio").addHandler(self.slow_handler)
+
+    def disable_slow_callbacks(self):
+        if self.slow_handler is not None:
+            self.client.loop.set_debug(False)
+            logging.getLogger("asyncio").removeHandler(self.slow_handler)
+            self.slow_handler = None
+
+    @profile.group(name="slow", invoke_without_command=True)
+    async def profile_slow(self, ctx: Context, threshold_ms: float = 100):
+        """Toggle reporting callbacks that block the loop longer than [threshold_ms]
+
+        This enables asyncio debug mode, which slows the bot down a little.
+        """
+        if self.slow_handler is not None:
+            self.disable_slow_callbacks()
+            await ctx.send("```css\nSlow callback detection [off]```")
+            return
+        self.enable_slow_callbacks(threshold_ms / 1000)
+        await ctx.send(
+            f"```css\nSlow callback detection [on], threshold {threshold_ms:g}ms```"
+        )
+
+    @profile_slow.command(name="show")
+    async def slow_show(self, ctx: Context):
+        """List the callbacks that blocked the loop recently"""
+        if self.slow_handler is None:
+            await ctx.send("Slow callback detection is off")
+            return
+        if not self.slow_handler.records:
+            await ctx.send("No slow callbacks so far")
+            return
+        lines = [
+            f"[{date.isoformat().split('.')[0]}] {message}"
+            for date, message in self.slow_handler.records
+        ]
+        await self.send_result(ctx, "\n".join(lines), "slow_callbacks.txt")
+
+
+def setup(client: Levi):
+    client.add_cog(Profiler(client))
@@ -0,0 +1,101 @@
+"""This is a cog for a discord.py bot.
+It keeps the image download directory within the limits set in config.json
+
+Commands:
+    retention           show what the next eviction pass would remove (dry-run)
+      - run             run an eviction pass now
+
+The eviction pass also runs in the background every `interval_minutes`.
+Only users which are specified as an admin in the config.json
+can run commands from this cog.
+"""
+import asyncio
+import time
+from pathlib import Path
+
+from bot import Levi
+from discord.ext import commands, tasks
+from discord.ext.commands.context import Context
+
+from cogs.utils.retention import RetentionPolicy, evict, format_size, plan, scan
+
+
+class Retention(commands.Cog, name="Retention"):
+    def __init__(self, client: Levi):
+        self.client = client
+        self.lock = asyncio.Lock()
+        interval = client.config.get("retention", {}).get("interval_minutes", 30)
+        self.background_evict.change_interval(minutes=interval)
+        self.background_evict.start()
+
+    def cog_unload(self):
+        self.background_evict.cancel()
+
+    async def cog_check(self, ctx: Context):
+        return self.client.user_is_admin(ctx.author)
+
+    @property
+    def save_dir(self) -> Path:
+        return Path(self.client.config.get("save_dir"))
+
+    async def make_plan(self):
+        policy = RetentionPolicy.from_config(self.client.config)
+        loop = asyncio.get_running_loop()
+        entries = await loop.run_in_executor(None, scan, self.save_dir)
+        return policy, entries, plan(entries, policy)
+
+    async def run_pass(self):
+        async with self.lock:
+            policy, _, evictions = await self.make_plan()
+            return await evict(evictions, policy)
+
+    @tasks.loop(minutes=30)
+    async def background_evict(self):
+        try:
+            await self.run_pass()
+        except Exception as e:
+            await self.client.log_error(e, "Retention background task")
+
+    @background_evict.before_loop
+    async def before_background_evict(self):
+        await self.client.wait_until_ready()
+
+    @commands.group(name="retention", invoke_without_command=True, hidden=True)
+    async def retention(self, ctx: Context):
+        """Show what the next eviction pass would remove"""
+        policy, entries, evictions = await self.make_plan()
+        total = sum(e.size for e in entries)
+        freed = sum(e.entry.size for e in evictions)
+        response = [
+            f"Directory: [{self.save_dir}] {len(entries)} files, {format_size(total)}",
+            "Limits: [size "
+            + (format_size(policy.max_bytes) if policy.max_bytes else "none")
+            + "] [age "
+            + (f"{policy.max_age / 86400:g} days" if policy.max_age else "none")
+            + "]",
+            f"Would remove {len(evictions)} files ({format_size(freed)})",
+        ]
+        now = time.time()
+        for eviction in evictions[:20]:
+            age_days = (now - eviction.entry.mtime) / 86400
+            response.append(
+                f"  - {eviction.entry.path.name} [{eviction.reason}]"
+                f" {format_size(eviction.entry.size)}, {age_days:.1f} days old"
+            )
+        if len(evictions) > 20:
+            response.append(f"  ... and {len(evictions) - 20} more")
+        await self.client.sender.send(
+            ctx, "\n".join(response), lang="css", filename="retention.txt"
+        )
+
+    @retention.command(name="run")
+    async def retention_run(self, ctx: Context):
+        """Run an eviction pass now"""
+        await ctx.trigger_typing()
+        removed = await self.run_pass()
+        freed = sum(e.entry.size for e in removed)
+        await ctx.send(f"Removed {len(removed)} files ({format_size(freed)})")
+
+
+def setup(client: Levi):
+    client.add_cog(Retention(client))
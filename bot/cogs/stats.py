@@ -0,0 +1,96 @@
+"""This is a cog for a discord.py bot.
+It reports the latency of commands and of the stages inside them
+
+Commands:
+    stats               show p50/p95/p99 latency, counts and error rates
+      - log             write the current stats to the log file
+      - reset           clear all recorded stats
+      - memory          show resident memory and the size of the client caches
+
+Only users which are specified as an admin in the config.json
+can run commands from this cog.
+"""
+import json
+import logging
+from datetime import datetime
+
+from bot import Levi
+from discord.ext import commands
+from discord.ext.commands.context import Context
+
+from cogs.utils.memprofile import memory_usage
+from cogs.utils.procinfo import format_mb, peak_rss_bytes
+
+log = logging.getLogger(__name__)
+
+
+class Stats(commands.Cog, name="Stats"):
+    def __init__(self, client: Levi):
+        self.client = client
+
+    async def cog_check(self, ctx: Context):
+        return self.client.user_is_admin(ctx.author)
+
+    @commands.group(name="stats", invoke_without_command=True, hidden=True)
+    async def stats(self, ctx: Context):
+        """Show latency percentiles per command and stage"""
+        metrics = self.client.metrics
+        rows = metrics.summary()
+        if not rows:
+            await ctx.send("No stats recorded yet")
+            return
+        since = datetime.fromtimestamp(metrics.since).isoformat().split(".")[0]
+        width = max(len(row["name"]) for row in rows)
+        response = [
+            f"Since [{since}], times in ms",
+            f"{'name':<{width}} {'count':>6} {'err%':>5}"
+            f" {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}",
+        ]
+        for row in rows:
+            response.append(
+                f"{row['name']:<{width}} {row['count']:>6} {row['error_rate']:>5.0%}"
+                f" {row['p50']:>7.1f} {row['p95']:>7.1f} {row['p99']:>7.1f}"
+                f" {row['max']:>7.1f}"
+            )
+        await self.client.sender.send(
+            ctx, "\n".join(response), lang="css", filename="stats.txt"
+        )
+
+    @stats.command(name="log")
+    async def stats_log(self, ctx: Context):
+        """Write the current stats to the log file"""
+        for row in self.client.metrics.summary():
+            log.info("stats %s", json.dumps(row))
+        await ctx.send("Stats written to the log")
+
+    @stats.command(name="reset", aliases=["clear"])
+    async def stats_reset(self, ctx: Context):
+        """Clear all recorded stats"""
+        self.client.metrics.reset()
+        await ctx.send("Stats cleared")
+
+    @stats.command(name="memory", aliases=["mem"])
+    async def stats_memory(self, ctx: Context):
+        """Show resident memory per guild and DM channel"""
+        usage = memory_usage(self.client)
+        cache = self.client.attachments.stats()
+        await ctx.send(
+            "```css\n"
+            f"profile        {usage['profile']}\n"
+            f"rss            {format_mb(usage['rss'])}"
+            f" (peak {format_mb(peak_rss_bytes())})\n"
+            f"guilds         {usage['guilds']}\n"
+            f"dm channels    {usage['dm_channels']}\n"
+            f"rss/channel    {format_mb(usage['rss_per_channel'])}\n"
+            f"cached users   {usage['users']}\n"
+            f"cached msgs    {usage['messages']}/{usage['max_messages']}\n"
+            f"attachments    {cache['memory_items']} in memory"
+            f" ({format_mb(cache['memory_bytes'])}), {cache['disk_items']} on disk"
+            f" ({format_mb(cache['disk_bytes'])}),"
+            f" {cache['hits']} hits / {cache['misses']} misses"
+            "```"
+        )
+
+
+def setup(client: Levi):
+    client.add_cog(Stats(client))
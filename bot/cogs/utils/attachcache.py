@@ -0,0 +1,213 @@
+"""Attachment cache shared by every command of the bot
+
+Discord attachments are keyed by their ID, which never changes for the same
+file. Downloaded bytes are kept in two LRUs:
+
+    memory  the most recent attachments, as bytes (default 32MB)
+    disk    every downloaded attachment, in `directory` (default 512MB)
+
+An attachment evicted from memory stays on disk until the disk LRU evicts
+it too. Concurrent requests for the same attachment share one download.
+With "prefetch" enabled, the bot starts downloading the attachments of an
+admin's DM as soon as it arrives, so the command it triggers (or a later
+one, like "error tb") finds the bytes already local.
+
+Configured in config.json:
+    "attachment_cache": {
+        "directory": "../cache/attachments",
+        "memory_mb": 32,
+        "disk_mb": 512,
+        "max_item_mb": 25,
+        "prefetch": true
+    }
+"""
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path, PurePath
+
+from aiohttp import ClientSession
+
+log = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class AttachmentCache:
+    def __init__(
+        self,
+        directory: str,
+        memory_bytes: int = 32 * MB,
+        disk_bytes: int = 512 * MB,
+        max_item_bytes: int = 25 * MB,
+        prefetch: bool = True,
+    ) -> None:
+        self.directory = Path(directory)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_item_bytes = max_item_bytes
+        self.prefetch_enabled = prefetch
+        self._memory: OrderedDict[int, bytes] = OrderedDict()
+        self._memory_used = 0
+        self._disk: OrderedDict[int, tuple] = OrderedDict()  # id -> (path, size)
+        self._disk_used = 0
+        self._inflight: dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self._scan()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "AttachmentCache":
+        conf = config.get("attachment_cache", {})
+        return cls(
+            conf.get("directory", "../cache/attachments"),
+            memory_bytes=int(conf.get("memory_mb", 32) * MB),
+            disk_bytes=int(conf.get("disk_mb", 512) * MB),
+            max_item_bytes=int(conf.get("max_item_mb", 25) * MB),
+            prefetch=conf.get("prefetch", True),
+        )
+
+    def _scan(self):
+        """Pick up the files left by a previous run, least recently used first"""
+        if not self.directory.is_dir():
+            return
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                attachment_id = int(path.stem)
+                stat = path.stat()
+            except (ValueError, OSError):
+                continue
+            entries.append((stat.st_atime, attachment_id, path, stat.st_size))
+        for _, attachment_id, path, size in sorted(entries):
+            self._disk[attachment_id] = (path, size)
+            self._disk_used += size
+
+    def __contains__(self, attachment_id: int) -> bool:
+        return attachment_id in self._memory or attachment_id in self._disk
+
+    def stats(self) -> dict:
+        return dict(
+            memory_items=len(self._memory),
+            memory_bytes=self._memory_used,
+            disk_items=len(self._disk),
+            disk_bytes=self._disk_used,
+            hits=self.hits,
+            misses=self.misses,
+        )
+
+    async def get(self, session: ClientSession, attachment_id: int, url: str) -> bytes:
+        """Return the attachment's bytes, downloading them if needed
+
+        Raises `aiohttp.ClientError` if the download fails.
+        """
+        data = self._memory.get(attachment_id)
+        if data is not None:
+            self._memory.move_to_end(attachment_id)
+            self.hits += 1
+            return data
+        task = self._inflight.get(attachment_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(session, attachment_id, url))
+            self._inflight[attachment_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(attachment_id, None))
+        # A prefetch may be shared by several commands, don't let one of
+        # them being cancelled cancel the download for the others
+        return await asyncio.shield(task)
+
+    def prefetch(self, session: ClientSession, attachments: list) -> None:
+        """Start downloading attachments in the background"""
+        if not self.prefetch_enabled:
+            return
+        for attachment in attachments:
+            if attachment.id in self or attachment.id in self._inflight:
+                continue
+            if attachment.size > self.max_item_bytes:
+                continue
+            task = asyncio.ensure_future(
+                self.get(session, attachment.id, attachment.url)
+            )
+            task.add_done_callback(self._prefetch_done)
+
+    @staticmethod
+    def _prefetch_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            # The command that needs the file will retry and report it
+            log.warning("Attachment prefetch failed: %r", task.exception())
+
+    async def _load(
+        self, session: ClientSession, attachment_id: int, url: str
+    ) -> bytes:
+        entry = self._disk.get(attachment_id)
+        if entry is not None:
+            try:
+                loop = asyncio.get_running_loop()
+                data = await loop.run_in_executor(None, entry[0].read_bytes)
+            except OSError:
+                self._forget_disk(attachment_id)
+            else:
+                self._disk.move_to_end(attachment_id)
+                self.hits += 1
+                self._remember(attachment_id, data)
+                return data
+
+        self.misses += 1
+        async with session.get(url) as r:
+            r.raise_for_status()
+            data = await r.read()
+        self._remember(attachment_id, data)
+        if len(data) <= self.max_item_bytes:
+            try:
+                await self._store(attachment_id, PurePath(url).suffix, data)
+            except OSError as e:
+                log.warning(
+                    "Could not cache attachment %s on disk: %s", attachment_id, e
+                )
+        return data
+
+    def _remember(self, attachment_id: int, data: bytes):
+        if len(data) > min(self.max_item_bytes, self.memory_bytes):
+            return
+        self._memory[attachment_id] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    async def _store(self, attachment_id: int, suffix: str, data: bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{attachment_id}{suffix.split('?')[0]}"
+        tmp = path.with_name(path.name + ".tmp")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _write_file, tmp, path, data)
+        self._forget_disk(attachment_id)
+        self._disk[attachment_id] = (path, len(data))
+        self._disk_used += len(data)
+
+        evicted = []
+        while self._disk_used > self.disk_bytes and len(self._disk) > 1:
+            evicted_id = next(iter(self._disk))
+            evicted.append(self._disk[evicted_id][0])
+            self._forget_disk(evicted_id)
+        if evicted:
+            await loop.run_in_executor(None, _unlink_all, evicted)
+
+    def _forget_disk(self, attachment_id: int):
+        entry = self._disk.pop(attachment_id, None)
+        if entry is not None:
+            self._disk_used -= entry[1]
+
+
+def _write_file(tmp: Path, path: Path, data: bytes):
+    tmp.write_bytes(data)
+    os.replace(tmp, path)  # Never leave a half written cache entry
+
+
+def _unlink_all(paths: list):
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
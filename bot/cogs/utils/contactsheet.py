@@ -0,0 +1,201 @@
+"""Contact sheets: a paginated grid of thumbnails from the download folder
+
+Thumbnails are generated in a process pool (decoding and resizing full
+size photos is CPU heavy and would otherwise block the bot) and cached in
+`<save_dir>/.thumbs/`, named after the SHA1 of the image file. Digests are
+remembered per path (with size and mtime to notice changes), so paging
+through a large folder only hashes the files of the requested page, and
+only once.
+
+The thumbnail cache is an LRU of at most `max_thumbs` files (10 pages by
+default): rendering a page marks its thumbnails as used, and the least
+recently used ones beyond the limit are deleted, including those of images
+the retention cleanup has removed. Images shown on a sheet are marked as
+used for the retention cleanup as well.
+"""
+
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from PIL import Image, ImageDraw
+
+from cogs.utils.retention import touch
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"}
+LABEL_HEIGHT = 14
+
+
+class SheetPage(NamedTuple):
+    image: bytes  # PNG data
+    page: int
+    pages: int
+    files: list
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_thumbnail(src: str, dest: str, size: int) -> Optional[str]:
+    """Write a thumbnail of `src` to `dest` (runs in a worker process)"""
+    try:
+        with Image.open(src) as img:
+            img.thumbnail((size, size))
+            img = img.convert("RGB")
+            tmp = dest + ".tmp"
+            img.save(tmp, format="JPEG", quality=80)
+            os.replace(tmp, dest)  # Never leave a half written cache entry
+        return dest
+    except (OSError, ValueError):
+        return None
+
+
+def render_sheet(thumbs: list, labels: list, columns: int, cell: int) -> bytes:
+    """Paste thumbnails into a labeled grid and return it as PNG data"""
+    rows = max(1, -(-len(thumbs) // columns))
+    sheet = Image.new("RGB", (columns * cell, rows * (cell + LABEL_HEIGHT)), "#202225")
+    draw = ImageDraw.Draw(sheet)
+    for i, (thumb, label) in enumerate(zip(thumbs, labels)):
+        x = (i % columns) * cell
+        y = (i // columns) * (cell + LABEL_HEIGHT)
+        if thumb is not None:
+            with Image.open(thumb) as img:
+                offset = ((cell - img.width) // 2, (cell - img.height) // 2)
+                sheet.paste(img, (x + offset[0], y + offset[1]))
+        draw.text((x + 2, y + cell), label[: cell // 6], fill="#dcddde")
+    out = io.BytesIO()
+    sheet.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+class ContactSheet:
+    def __init__(
+        self,
+        save_dir: str,
+        thumb_size: int = 160,
+        columns: int = 5,
+        rows: int = 4,
+        max_workers: int = 2,
+        max_thumbs: Optional[int] = None,
+    ) -> None:
+        self.save_dir = Path(save_dir)
+        self.cache_dir = self.save_dir / ".thumbs"
+        self.thumb_size = thumb_size
+        self.columns = columns
+        self.per_page = columns * rows
+        self.max_workers = max_workers
+        self.max_thumbs = max_thumbs or self.per_page * 10
+        self._digests: dict[str, tuple] = {}  # path -> (size, mtime_ns, sha1)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def list_images(self) -> list:
+        """Images in the download folder, newest first (blocking)"""
+        if not self.save_dir.is_dir():
+            return []
+        files = [
+            p
+            for p in self.save_dir.iterdir()
+            if p.suffix.lower() in IMAGE_SUFFIXES and not p.name.startswith(".")
+        ]
+        return sorted(files, key=lambda p: p.name, reverse=True)
+
+    def thumbnail_jobs(self, files: list) -> list:
+        """Return (file, cached thumbnail path, exists) for each file (blocking)
+
+        Files deleted since they were listed are left out.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        jobs = []
+        for path in files:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Removed by the retention cleanup in the meantime
+            cached = self._digests.get(str(path))
+            if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+                try:
+                    digest = file_digest(path)
+                except FileNotFoundError:
+                    continue
+                cached = (stat.st_size, stat.st_mtime_ns, digest)
+                self._digests[str(path)] = cached
+            thumb = self.cache_dir / f"{cached[2]}-{self.thumb_size}.jpg"
+            exists = thumb.is_file()
+            if exists:
+                os.utime(thumb)  # Used, for the LRU in prune()
+            touch(path)  # Shown on the sheet counts as displayed for retention
+            jobs.append((path, thumb, exists))
+        return jobs
+
+    def prune(self, files: list) -> None:
+        """Bound the thumbnail cache and forget unlisted images (blocking)
+
+        `files` is the current listing of the download folder.
+        """
+        listed = {str(path) for path in files}
+        gone = {d[2] for p, d in self._digests.items() if p not in listed}
+        self._digests = {p: d for p, d in self._digests.items() if p in listed}
+        gone -= {d[2] for d in self._digests.values()}  # Still used by a copy
+        thumbs = []
+        for thumb in self.cache_dir.glob("*.jpg"):
+            if thumb.name.split("-", 1)[0] in gone:
+                thumb.unlink(missing_ok=True)  # Its image was deleted
+                continue
+            try:
+                thumbs.append((thumb.stat().st_mtime, thumb))
+            except FileNotFoundError:
+                continue
+        thumbs.sort(reverse=True)  # Most recently used first
+        for _, thumb in thumbs[self.max_thumbs :]:
+            try:
+                thumb.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def render(self, page: int = 1) -> SheetPage:
+        loop = asyncio.get_running_loop()
+        all_files = await loop.run_in_executor(None, self.list_images)
+        pages = max(1, -(-len(all_files) // self.per_page))
+        page = min(max(1, page), pages)
+        files = all_files[(page - 1) * self.per_page : page * self.per_page]
+
+        jobs = await loop.run_in_executor(None, self.thumbnail_jobs, files)
+        if self._pool is None:
+            # Not forked: the bot has threads (logging queue, executors)
+            # whose locks a forked child could inherit held
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        missing = [
+            loop.run_in_executor(
+                self._pool, make_thumbnail, str(src), str(thumb), self.thumb_size
+            )
+            for src, thumb, exists in jobs
+            if not exists
+        ]
+        await asyncio.gather(*missing)
+
+        files = [src for src, _, _ in jobs]
+        thumbs = [str(thumb) if thumb.is_file() else None for _, thumb, _ in jobs]
+        labels = [src.stem for src, _, _ in jobs]
+        image = await loop.run_in_executor(
+            self._pool, render_sheet, thumbs, labels, self.columns, self.thumb_size
+        )
+        await loop.run_in_executor(None, self.prune, all_files)
+        return SheetPage(image, page, pages, files)
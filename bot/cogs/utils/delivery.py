@@ -0,0 +1,133 @@
+"""Fan-out delivery of images to several display servers
+
+Every target gets its own request, all running concurrently over the
+bot's pooled `ClientSession`, so a slow or offline frame never delays the
+others. Each target keeps its own retry state: after a failed delivery it
+backs off, and while backing off it only gets a single attempt per image
+instead of the full retry schedule.
+
+Targets are configured in config.json:
+    "targets": [
+        {"name": "living-room", "api_root": "http://10.0.0.5:80"},
+        {"name": "kitchen", "api_root": "http://10.0.0.6:80", "topics": ["food"]}
+    ]
+A target with topics only receives images whose message contains one of
+them as a hashtag (e.g. "#food"). Without "targets", the single `api_root`
+is used.
+"""
+import asyncio
+import re
+import time
+from typing import NamedTuple, Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+DEFAULT_ENDPOINT = "/api/v1/send_image"
+HASHTAG_RE = re.compile(r"#(\w+)")
+
+
+def parse_topics(text: Optional[str]) -> set:
+    return {tag.lower() for tag in HASHTAG_RE.findall(text or "")}
+
+
+class Target:
+    def __init__(self, name: str, url: str, topics=None) -> None:
+        self.name = name
+        self.url = url
+        self.topics = {t.lower() for t in topics} if topics else None
+        # Retry state
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+
+    def accepts(self, topics: set) -> bool:
+        return self.topics is None or bool(self.topics & topics)
+
+    @property
+    def backing_off(self) -> bool:
+        return time.monotonic() < self.retry_at
+
+
+class DeliveryResult(NamedTuple):
+    target: Target
+    ok: bool
+    latency: float
+    attempts: int
+    error: Optional[str]
+
+
+class FanOut:
+    def __init__(
+        self,
+        session: ClientSession,
+        targets: list,
+        timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 5,
+        max_backoff: float = 300,
+    ) -> None:
+        self.session = session
+        self.targets = targets
+        self.timeout = ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def from_config(cls, session: ClientSession, config: dict) -> "FanOut":
+        endpoint = config.get("api_send_endpoint", DEFAULT_ENDPOINT)
+        targets = [
+            Target(
+                t.get("name", t["api_root"]),
+                t["api_root"] + t.get("api_send_endpoint", endpoint),
+                t.get("topics"),
+            )
+            for t in config.get("targets", [])
+        ]
+        if not targets:
+            targets = [Target("default", config["api_root"] + endpoint)]
+        conf = config.get("delivery", {})
+        return cls(
+            session,
+            targets,
+            timeout=conf.get("timeout", 10),
+            retries=conf.get("retries", 3),
+            backoff=conf.get("backoff", 5),
+            max_backoff=conf.get("max_backoff", 300),
+        )
+
+    async def deliver(self, body: dict, topics: set = frozenset()) -> list:
+        """Send `body` to every target accepting `topics`, concurrently"""
+        targets = [t for t in self.targets if t.accepts(topics)]
+        return await asyncio.gather(*(self._deliver_one(t, body) for t in targets))
+
+    async def _deliver_one(self, target: Target, body: dict) -> DeliveryResult:
+        attempts = 1 if target.backing_off else self.retries
+        start = time.perf_counter()
+        error = None
+        for attempt in range(1, attempts + 1):
+            try:
+                async with self.session.post(
+                    target.url, json=body, timeout=self.timeout
+                ) as r:
+                    r.raise_for_status()
+                    await r.read()
+            except (ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                if attempt < attempts:
+                    await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 5))
+                continue
+            target.failures = 0
+            target.retry_at = 0.0
+            target.last_error = None
+            return DeliveryResult(
+                target, True, time.perf_counter() - start, attempt, None
+            )
+
+        target.failures += 1
+        target.last_error = error
+        delay = min(self.backoff * 2 ** (target.failures - 1), self.max_backoff)
+        target.retry_at = time.monotonic() + delay
+        return DeliveryResult(
+            target, False, time.perf_counter() - start, attempts, error
+        )
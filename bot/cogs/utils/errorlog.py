@@ -0,0 +1,174 @@
+"""Bounded store for unhandled errors
+
+Errors are kept as compact `ErrorRecord`s: the formatted traceback and
+plain IDs/strings copied out of the invoking `Context`, never the live
+exception, context or attachment objects.
+Repeats of the same error (same exception type and call stack) are grouped
+under one record with an occurrence count.
+
+The store holds at most `maxlen` records. When it overflows, the oldest
+record is queued until `take_pending()` hands it to `flush()`, which appends
+it to an NDJSON file. Only `flush()` may run on another thread.
+"""
+import hashlib
+import json
+import traceback
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from discord.ext.commands import Context
+
+
+class ErrorRecord:
+    __slots__ = (
+        "fingerprint",
+        "exc_type",
+        "message",
+        "traceback",
+        "first_seen",
+        "last_seen",
+        "count",
+        "source",
+        "command",
+        "guild_id",
+        "guild_name",
+        "channel_id",
+        "channel_name",
+        "author_id",
+        "author_name",
+        "author_avatar",
+        "content",
+        "jump_url",
+        "attachment_id",
+        "attachment_url",
+    )
+
+    def __init__(self, **fields) -> None:
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_error(
+        cls, error: BaseException, source: Union[Context, str, None] = None
+    ) -> "ErrorRecord":
+        now = datetime.now(tz=timezone.utc)
+        record = cls(
+            fingerprint=fingerprint(error),
+            exc_type=type(error).__name__,
+            message=str(error)[:1000],
+            traceback="".join(
+                traceback.format_exception(type(error), error, error.__traceback__)
+            ),
+            first_seen=now,
+            last_seen=now,
+            count=1,
+        )
+        if isinstance(source, Context):
+            msg = source.message
+            record.source = f"CMD:{source.invoked_with}"
+            record.command = source.invoked_with
+            record.guild_id = source.guild.id if source.guild else None
+            record.guild_name = source.guild.name if source.guild else None
+            record.channel_id = source.channel.id
+            record.channel_name = getattr(source.channel, "name", None)
+            record.author_id = source.author.id
+            record.author_name = f"{source.author.name}#{source.author.discriminator}"
+            record.author_avatar = str(source.author.avatar_url)
+            record.content = msg.content
+            record.jump_url = msg.jump_url
+            if msg.attachments:
+                record.attachment_id = msg.attachments[0].id
+                record.attachment_url = msg.attachments[0].url
+        else:
+            record.source = str(source) if source is not None else None
+        return record
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["first_seen"] = self.first_seen.isoformat()
+        data["last_seen"] = self.last_seen.isoformat()
+        return data
+
+
+def fingerprint(error: BaseException) -> str:
+    """Identify an error by its type and call stack, ignoring line numbers and message
+
+    Chained exceptions are included, so two `CommandInvokeError`s wrapping
+    different original errors get different fingerprints.
+    """
+    digest = hashlib.sha1()
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        digest.update(type(error).__qualname__.encode())
+        for frame in traceback.extract_tb(error.__traceback__):
+            digest.update(f"{frame.filename}:{frame.name}:{frame.line}".encode())
+        error = error.__cause__ or error.__context__
+    return digest.hexdigest()[:12]
+
+
+class ErrorLog:
+    def __init__(self, maxlen: int = 50, overflow_file: Optional[str] = None) -> None:
+        self.maxlen = maxlen
+        self.overflow_file = Path(overflow_file) if overflow_file else None
+        self._records: list[ErrorRecord] = []
+        self._pending: list[ErrorRecord] = []
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ErrorLog":
+        conf = config.get("error_log", {})
+        return cls(
+            maxlen=conf.get("max_records", 50),
+            overflow_file=conf.get("overflow_file", "../logs/errors.ndjson"),
+        )
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[ErrorRecord]:
+        return iter(self._records)
+
+    def __getitem__(self, n: int) -> ErrorRecord:
+        return self._records[n]
+
+    def add(
+        self, error: BaseException, source: Union[Context, str, None] = None
+    ) -> ErrorRecord:
+        """Store an error, merged into the record with the same fingerprint if any"""
+        record = ErrorRecord.from_error(error, source)
+        for i, existing in enumerate(self._records):
+            if existing.fingerprint == record.fingerprint:
+                # Keep the details of the latest occurrence, but the first timestamp
+                record.first_seen = existing.first_seen
+                record.count = existing.count + 1
+                del self._records[i]
+                break
+        self._records.append(record)
+        while len(self._records) > self.maxlen:
+            self._pending.append(self._records.pop(0))
+        return record
+
+    def pop(self, n: int) -> ErrorRecord:
+        return self._records.pop(n)
+
+    def clear(self) -> None:
+        self._records = []
+
+    def take_pending(self) -> list:
+        """Return the overflowed records not yet flushed, and forget them"""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def flush(self, records: list) -> int:
+        """Append records from `take_pending()` to the overflow file (blocking I/O)
+
+        Returns the number of records written.
+        """
+        if not records or self.overflow_file is None:
+            return 0
+        self.overflow_file.parent.mkdir(parents=True, exist_ok=True)
+        with self.overflow_file.open("a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record.to_dict()) + "\n")
+        return len(records)
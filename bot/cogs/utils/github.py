@@ -0,0 +1,133 @@
+"""Cached commit history of the GitHub repository
+
+Commits are stored by SHA. The newest page is re-validated with an
+`If-None-Match` conditional request at most once per `ttl` seconds, so
+an unchanged repository costs a single 304 response (which does not count
+against the GitHub rate limit). Older pages are fetched only when a lookup
+needs to reach further back than what is already cached.
+"""
+import time
+from typing import Optional
+
+from aiohttp import ClientSession
+
+
+class CommitHistory:
+    def __init__(
+        self,
+        session: ClientSession,
+        repo: str,
+        branch: str = "master",
+        token: Optional[str] = None,
+        ttl: float = 300,
+        per_page: int = 30,
+        api_root: str = "https://api.github.com",
+    ) -> None:
+        self.session = session
+        self.ttl = ttl
+        self.url = f"{api_root}/repos/{repo}/commits?per_page={per_page}&sha={branch}"
+        self.headers = {"Accept": "application/vnd.github.v3+json"}
+        if token:
+            self.headers["Authorization"] = f"token {token}"
+        self.commits: dict[str, dict] = {}  # sha -> commit data
+        self.order: list[str] = []  # newest first
+        self.etag: Optional[str] = None
+        self.fetched_at = 0.0
+        # Next page after the oldest cached commit
+        self._older_url: Optional[str] = None
+        self._exhausted = False
+
+    @classmethod
+    def from_config(cls, session: ClientSession, config: dict) -> "CommitHistory":
+        return cls(
+            session,
+            config["github_repo"],
+            branch=config.get("github_branch", "master"),
+            token=config.get("github_key") or None,
+            ttl=config.get("github_cache_ttl", 300),
+        )
+
+    async def _get(self, url: str, etag: Optional[str] = None):
+        headers = dict(self.headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return None, etag, None
+            response.raise_for_status()
+            data = await response.json()
+            next_url = response.links.get("next", {}).get("url")
+            return data, response.headers.get("ETag"), next_url
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Check the newest page for new commits
+
+        Returns True if new commits were found.
+        """
+        if not force and time.monotonic() - self.fetched_at < self.ttl:
+            return False
+        data, etag, next_url = await self._get(self.url, self.etag)
+        self.fetched_at = time.monotonic()
+        if data is None:
+            return False
+        self.etag = etag
+
+        known = self.commits
+        new = []
+        while True:
+            for commit in data:
+                if commit["sha"] in known:
+                    break
+                new.append(commit)
+            else:
+                if next_url and known:
+                    # More than a page of new commits; keep going until we overlap
+                    data, _, next_url = await self._get(next_url)
+                    continue
+            break
+
+        if not known:
+            # First fetch: the cache is just this page
+            self._older_url = next_url
+            self._exhausted = next_url is None
+        for commit in new:
+            self.commits[commit["sha"]] = commit
+        self.order = [c["sha"] for c in new] + self.order
+        return bool(new)
+
+    async def _extend(self) -> bool:
+        """Fetch the next page of older commits, returns False at the end of history"""
+        if self._exhausted or self._older_url is None:
+            self._exhausted = True
+            return False
+        data, _, next_url = await self._get(self._older_url)
+        for commit in data or ():
+            if commit["sha"] not in self.commits:
+                self.commits[commit["sha"]] = commit
+                self.order.append(commit["sha"])
+        self._older_url = next_url
+        self._exhausted = next_url is None
+        return True
+
+    async def commits_since(
+        self, sha: str, min_count: int = 0
+    ) -> tuple[int, list[dict]]:
+        """Return how many commits are newer than `sha`, plus the commit data
+
+        The list holds the newer commits, padded with older ones up to `min_count`.
+        If `sha` is not in the remote history, every cached commit counts as new.
+        """
+        await self.refresh()
+        if sha not in self.commits:
+            # Usually a local commit newer than the cached head, e.g. right
+            # after a pull: check the newest page before paging back in time
+            await self.refresh(force=True)
+        while sha not in self.commits and await self._extend():
+            pass
+        if sha in self.commits:
+            num = self.order.index(sha)
+        else:
+            num = len(self.order)
+        while len(self.order) < max(num, min_count) and await self._extend():
+            pass
+        return num, [self.commits[s] for s in self.order[: max(num, min_count)]]
@@ -0,0 +1,80 @@
+"""Read the checked out commit straight from the `.git` directory
+
+This avoids starting a `git` process just to learn the current version.
+Only the commit hash is guaranteed; the commit date can only be read
+from loose objects (packed objects return `None`).
+"""
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+
+def find_git_dir(start: Path = None) -> Optional[Path]:
+    """Search `start` and its parents for the repository's git directory"""
+    start = Path.cwd() if start is None else start
+    for folder in (start, *start.resolve().parents):
+        candidate = folder / ".git"
+        if candidate.is_dir():
+            return candidate
+        if candidate.is_file():
+            # Worktrees and submodules point to the real git dir
+            content = candidate.read_text().strip()
+            if content.startswith("gitdir:"):
+                return (folder / content[7:].strip()).resolve()
+    return None
+
+
+def resolve_ref(git_dir: Path, ref: str) -> Optional[str]:
+    loose = git_dir / ref
+    if loose.is_file():
+        return loose.read_text().strip()
+    packed = git_dir / "packed-refs"
+    if packed.is_file():
+        for line in packed.read_text().splitlines():
+            if line.endswith(" " + ref):
+                return line.split(" ")[0]
+    return None
+
+
+def read_head(git_dir: Path) -> Optional[str]:
+    """Return the hash of the checked out commit"""
+    head = (git_dir / "HEAD").read_text().strip()
+    if head.startswith("ref:"):
+        return resolve_ref(git_dir, head[4:].strip())
+    return head
+
+
+def read_commit_date(git_dir: Path, sha: str) -> Optional[str]:
+    """Return the committer date of a loose commit object in ISO format"""
+    obj = git_dir / "objects" / sha[:2] / sha[2:]
+    if not obj.is_file():
+        return None
+    data = zlib.decompress(obj.read_bytes())
+    header, _, body = data.partition(b"\0")
+    if not header.startswith(b"commit"):
+        return None
+    for line in body.decode(errors="replace").splitlines():
+        if not line:
+            break
+        if line.startswith("committer "):
+            timestamp, offset = line.rsplit(" ", 2)[-2:]
+            sign = -1 if offset[0] == "-" else 1
+            delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+            tz = timezone(sign * delta)
+            return datetime.fromtimestamp(int(timestamp), tz=tz).isoformat()
+    return None
+
+
+def read_version(start: Path = None) -> tuple[Optional[str], Optional[str]]:
+    """Return (commit hash, commit date) of the checked out commit
+
+    Either is None when it can't be read.
+    """
+    git_dir = find_git_dir(start)
+    if git_dir is None:
+        return (None, None)
+    sha = read_head(git_dir)
+    if sha is None:
+        return (None, None)
+    return (sha, read_commit_date(git_dir, sha))
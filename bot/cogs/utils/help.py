@@ -0,0 +1,146 @@
+"""Help command shared by the help and helpall cogs
+
+Grouping, sorting and filtering every command is the expensive part of
+a help call, so rendered embeds are kept in a `HelpCache` on the bot.
+There is one entry per view (admin, non-admin or show-hidden) and help page.
+The bot clears the cache whenever an extension is loaded, unloaded or
+reloaded, because that is the only time the command list changes.
+"""
+
+import itertools
+from discord import Embed
+from discord.ext.commands import HelpCommand
+
+# pylint: disable=E1101
+
+
+class HelpCache:
+    def __init__(self) -> None:
+        self._embeds: dict[tuple, Embed] = {}
+
+    def __len__(self) -> int:
+        return len(self._embeds)
+
+    def get(self, key: tuple):
+        return self._embeds.get(key)
+
+    def put(self, key: tuple, embed: Embed) -> None:
+        self._embeds[key] = embed
+
+    def clear(self) -> None:
+        self._embeds.clear()
+
+
+class myHelpCommand(HelpCommand):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.paginator = None
+        self.spacer = "\u1160 "  # Invisible Unicode Character to indent lines
+
+    def cache_key(self, page=None):
+        """Identify a help page as seen by the invoking user"""
+        if self.show_hidden:
+            view = "hidden"
+        elif self.context.bot.user_is_admin(self.context.author):
+            view = "admin"
+        else:
+            view = "user"
+        return (view, page)
+
+    async def send_cached(self, key):
+        """Send a cached page, returns False if it has to be built first"""
+        embed = self.context.bot.help_cache.get(key)
+        if embed is None:
+            return False
+        await self.get_destination().send(embed=embed)
+        return True
+
+    def build_embed(self, header=False, footer=False):
+        embed = Embed(color=0x2ECC71)
+        if header:
+            embed.set_author(
+                name=self.context.bot.description,
+                icon_url=self.context.bot.user.avatar_url,
+            )
+        for category, entries in self.paginator:
+            embed.add_field(name=category, value=entries, inline=False)
+        if footer:
+            embed.set_footer(text="Use help <command/category> for more information.")
+        return embed
+
+    async def send_pages(self, header=False, footer=False, cache_key=None):
+        embed = self.build_embed(header, footer)
+        if cache_key is not None:
+            self.context.bot.help_cache.put(cache_key, embed)
+        await self.get_destination().send(embed=embed)
+
+    async def send_bot_help(self, mapping):
+        key = self.cache_key()
+        if await self.send_cached(key):
+            return
+        ctx = self.context
+        bot = ctx.bot
+
+        def get_category(command):
+            cog = command.cog
+            return cog.qualified_name + ":" if cog is not None else "Help:"
+
+        filtered = await self.filter_commands(bot.commands, sort=True, key=get_category)
+        to_iterate = itertools.groupby(filtered, key=get_category)
+        for cog_name, command_grouper in to_iterate:
+            cmds = sorted(command_grouper, key=lambda c: c.name)
+            category = f"► {cog_name}"
+            if len(cmds) == 1:
+                entries = f"{self.spacer}{cmds[0].name} → {cmds[0].short_doc}"
+            else:
+                entries = ""
+                while len(cmds) > 0:
+                    entries += self.spacer
+                    entries += " | ".join([cmd.name for cmd in cmds[0:8]])
+                    cmds = cmds[8:]
+                    entries += "\n" if cmds else ""
+            self.paginator.append((category, entries))
+        await self.send_pages(header=True, footer=True, cache_key=key)
+
+    async def send_cog_help(self, cog):
+        key = self.cache_key(f"cog:{cog.qualified_name}")
+        if await self.send_cached(key):
+            return
+        filtered = await self.filter_commands(cog.get_commands(), sort=True)
+        if not filtered:
+            await self.context.send("No public commands in this cog.")
+            return
+        category = f"▼ {cog.qualified_name}"
+        entries = "\n".join(
+            self.spacer
+            + f"**{command.name}** → {command.short_doc or command.description}"
+            for command in filtered
+        )
+        self.paginator.append((category, entries))
+        await self.send_pages(footer=True, cache_key=key)
+
+    async def send_group_help(self, group):
+        key = self.cache_key(f"group:{group.qualified_name}")
+        if await self.send_cached(key):
+            return
+        filtered = await self.filter_commands(group.commands, sort=True)
+        if not filtered:
+            await self.context.send("No public commands in group.")
+            return
+        category = f"**{group.name}** - {group.description or group.short_doc}"
+        entries = "\n".join(
+            self.spacer + f"**{command.name}** → {command.short_doc}"
+            for command in filtered
+        )
+        self.paginator.append((category, entries))
+        await self.send_pages(footer=True, cache_key=key)
+
+    async def send_command_help(self, command):
+        signature = self.get_command_signature(command)
+        helptext = command.help or command.description or "No help Text"
+        self.paginator.append((signature, helptext))
+        await self.send_pages()
+
+    async def prepare_help_command(self, ctx, command=None):
+        self.paginator = []
+        await super().prepare_help_command(ctx, command)
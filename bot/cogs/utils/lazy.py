@@ -0,0 +1,102 @@
+"""Lazy extension loading
+
+Extensions listed in the manifest (cogs/manifest.json) are not imported
+at startup. Instead, a lightweight stub command is registered for each of
+their commands. The first time a stub is invoked, it swaps itself out for
+the real extension and re-dispatches the message, so the user never notices.
+
+Only list extensions that do nothing until one of their commands is used.
+An extension that starts background work when it loads (like the retention
+cog's eviction loop) must load at startup, or that work would never start.
+
+Manifest format:
+    {"cogs.images": [{"name": "save", "brief": "...", "hidden": false}, ...]}
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from discord.ext import commands
+
+from cogs.utils.procinfo import format_mb, peak_rss_bytes, rss_bytes
+
+
+class LazyExtensions:
+    def __init__(self, bot: commands.Bot, manifest_file: str) -> None:
+        self.bot = bot
+        self.manifest_file = Path(manifest_file)
+        self.pending: dict[str, list] = {}  # extension -> manifest entries of its stubs
+        self.load_times: dict[str, float] = {}  # extension -> seconds
+        self._lock = None
+
+    def read_manifest(self) -> dict:
+        if not self.manifest_file.is_file():
+            return {}
+        with self.manifest_file.open() as f:
+            return json.load(f)
+
+    def install(self) -> set:
+        """Register stubs for every extension in the manifest that isn't loaded yet
+
+        Returns the names of the deferred extensions.
+        """
+        for extension, entries in self.read_manifest().items():
+            if extension in self.bot.extensions or extension in self.pending:
+                continue
+            self._add_stubs(extension, entries)
+        return set(self.pending)
+
+    def _add_stubs(self, extension: str, entries: list) -> None:
+        self.pending[extension] = entries
+        for entry in entries:
+            self.bot.add_command(self._make_stub(extension, entry))
+
+    def _make_stub(self, extension: str, entry: dict) -> commands.Command:
+        async def stub(ctx, *, args: str = None):
+            await self.load(extension)
+            # Parse the message again, now that the real command exists
+            new_ctx = await ctx.bot.get_context(ctx.message)
+            await ctx.bot.invoke(new_ctx)
+
+        command = commands.Command(
+            stub,
+            name=entry["name"],
+            aliases=entry.get("aliases", []),
+            brief=entry.get("brief"),
+            help=entry.get("help") or entry.get("brief"),
+            hidden=entry.get("hidden", False),
+        )
+        command.lazy_stub = True  # Not timed, the real command is
+        return command
+
+    async def load(self, extension: str) -> None:
+        """Replace the stubs of a deferred extension with the real one"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            entries = self.pending.pop(extension, None)
+            if entries is None:
+                return  # Loaded in the meantime
+            for entry in entries:
+                self.bot.remove_command(entry["name"])
+            start = time.perf_counter()
+            try:
+                self.bot.load_extension(extension)
+            except Exception:
+                self._add_stubs(extension, entries)
+                raise
+            self.load_times[extension] = time.perf_counter() - start
+
+
+def startup_report(bot: commands.Bot, load_time: float, ready_time: float) -> str:
+    """Summarize startup cost, to compare lazy and eager extension loading"""
+    lazy = bot.lazy_extensions
+    mode = "lazy" if bot.config.get("lazy_extensions", False) else "eager"
+    mode += ", " + bot.config.get("memory_profile", "default") + " memory profile"
+    return (
+        f"Startup ({mode}): {len(bot.extensions)} extensions loaded"
+        f" in {load_time * 1000:.0f}ms, {len(lazy.pending)} deferred,"
+        f" ready after {ready_time:.1f}s."
+        f" RSS {format_mb(rss_bytes())} (peak {format_mb(peak_rss_bytes())})"
+    )
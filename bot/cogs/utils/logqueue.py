@@ -0,0 +1,85 @@
+"""Non-blocking logging setup
+
+The root logger only gets a `QueueHandler`, which just puts the record on
+a queue. A `QueueListener` thread takes records off the queue and does the
+actual (slow, SD card) console and file writes, so logging never blocks
+the event loop.
+"""
+import copy
+import json
+import logging
+import os
+import queue
+from datetime import datetime
+from logging import handlers
+
+TEXT_FORMAT = "%(asctime)s:%(levelname)s:%(name)s: %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data)
+
+
+class TracebackQueueHandler(handlers.QueueHandler):
+    """Queue handler that keeps the traceback apart from the message
+
+    The default `prepare()` merges the traceback into the message text,
+    which would hide it from the JSON formatter's "exc_info" field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def setup_logging(
+    log_filename: str = "../logs/discord.log",
+    json_format: bool = False,
+    level: int = logging.INFO,
+) -> handlers.QueueListener:
+    """Route all logging through a queue to a background thread
+
+    Returns the started listener; call its `stop()` on shutdown to flush it.
+    """
+    os.makedirs(os.path.dirname(log_filename), exist_ok=True)
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    stream_handler = logging.StreamHandler()
+    file_handler = handlers.RotatingFileHandler(
+        filename=log_filename,
+        encoding="utf-8",
+        maxBytes=(1048576),  # 1 MB max
+        backupCount=4,
+    )
+    for handler in (stream_handler, file_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = handlers.QueueListener(
+        log_queue, stream_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(TracebackQueueHandler(log_queue))
+    root.setLevel(level)
+    return listener
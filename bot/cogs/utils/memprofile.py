@@ -0,0 +1,56 @@
+"""Memory profiles for the discord client
+
+The bot only handles commands in DMs, so most of what discord.py caches by
+default is never used. Set "memory_profile" in config.json to pick one:
+
+    "default"   a 15000 message cache, as before
+    "lean"      a small message cache and no member cache or guild chunking,
+                for running next to the display server on a 512MB Pi
+
+The message cache is only needed to re-run a command when its message is
+edited (discord only sends `on_message_edit` for cached messages), and
+commands are rarely edited more than a few minutes later. The lean size can
+be changed with "message_cache" in config.json.
+"""
+
+from discord import Client, Intents, MemberCacheFlags
+
+from cogs.utils.procinfo import rss_bytes
+
+PROFILES = ("default", "lean")
+LEAN_MESSAGE_CACHE = 250
+
+
+def client_options(config: dict) -> dict:
+    """Keyword arguments for the bot constructor"""
+    profile = config.get("memory_profile", "default")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown memory_profile {profile!r}, use one of {PROFILES}")
+    # Direct messages are the only events the bot handles
+    options = dict(intents=Intents(dm_messages=True))
+    if profile == "lean":
+        options.update(
+            max_messages=config.get("message_cache", LEAN_MESSAGE_CACHE),
+            member_cache_flags=MemberCacheFlags.none(),
+            chunk_guilds_at_startup=False,
+        )
+    else:
+        options.update(max_messages=15000)
+    return options
+
+
+def memory_usage(client: Client) -> dict:
+    """Resident memory and the size of the client caches"""
+    rss = rss_bytes()
+    guilds = len(client.guilds)
+    dm_channels = len(client.private_channels)
+    return dict(
+        profile=client.config.get("memory_profile", "default"),
+        rss=rss,
+        guilds=guilds,
+        dm_channels=dm_channels,
+        rss_per_channel=rss / max(1, guilds + dm_channels),
+        users=len(client.users),
+        messages=len(client.cached_messages),
+        max_messages=client._connection.max_messages,  # pylint: disable=W0212
+    )
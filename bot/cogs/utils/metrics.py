@@ -0,0 +1,89 @@
+"""Latency histograms for commands and the stages inside them
+
+Each histogram has fixed, logarithmically spaced buckets from 1ms to ~2min,
+so recording a sample is O(log n) and memory stays constant no matter how
+long the bot runs. Percentiles are interpolated within a bucket, which
+keeps them within ~20% of the true value.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+
+BUCKET_BOUNDS = [0.001 * 1.2 ** i for i in range(65)]  # seconds
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "errors", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile (0-100) in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+                high = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                return min(low + (high - low) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.histograms: dict[str, Histogram] = {}
+        self.since = time.time()
+
+    def observe(self, name: str, seconds: float, error: bool = False) -> None:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].observe(seconds, error)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time the body of a `with` block; an exception counts as an error"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(name, time.perf_counter() - start, error=True)
+            raise
+        self.observe(name, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        self.histograms = {}
+        self.since = time.time()
+
+    def summary(self) -> list[dict]:
+        """One row per histogram, sorted by name, times in milliseconds"""
+        rows = []
+        for name, hist in sorted(self.histograms.items()):
+            rows.append(
+                dict(
+                    name=name,
+                    count=hist.count,
+                    errors=hist.errors,
+                    error_rate=hist.errors / hist.count if hist.count else 0.0,
+                    mean=hist.total / hist.count * 1000 if hist.count else 0.0,
+                    p50=hist.percentile(50) * 1000,
+                    p95=hist.percentile(95) * 1000,
+                    p99=hist.percentile(99) * 1000,
+                    max=hist.max * 1000,
+                )
+            )
+        return rows
@@ -0,0 +1,85 @@
+"""Non-blocking subprocess runner
+
+Commands are started with `asyncio.create_subprocess_exec`, so a slow
+`git pull` never blocks the event loop. Each runner limits how many of its
+commands run at once, and kills a command that exceeds its timeout.
+
+Failures are reported with the same exceptions as the `subprocess` module:
+`CalledProcessError` for a non-zero exit code and `TimeoutExpired` on timeout.
+"""
+import asyncio
+import subprocess
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+OutputCallback = Callable[[str], Awaitable[None]]
+
+
+class CommandResult(NamedTuple):
+    args: tuple
+    returncode: int
+    output: str
+    elapsed: float
+
+
+class CommandRunner:
+    def __init__(self, max_concurrent: int = 1, timeout: float = 60) -> None:
+        self.timeout = timeout
+        self._guard = asyncio.Semaphore(max_concurrent)
+
+    @property
+    def busy(self) -> bool:
+        return self._guard.locked()
+
+    async def run(
+        self,
+        *args: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[OutputCallback] = None,
+        cwd: Optional[str] = None,
+        check: bool = True,
+    ) -> CommandResult:
+        """Run a command and return its combined stdout/stderr
+
+        If `on_output` is given, it is awaited with every line of output
+        as soon as the line is produced.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        async with self._guard:
+            start = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                stdin=asyncio.subprocess.DEVNULL,
+                cwd=cwd,
+            )
+            lines = []
+            try:
+                await asyncio.wait_for(
+                    self._collect(proc, lines, on_output), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise subprocess.TimeoutExpired(args, timeout, "".join(lines))
+            except asyncio.CancelledError:
+                proc.kill()
+                raise
+            output = "".join(lines)
+            if check and proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, args, output)
+            elapsed = time.perf_counter() - start
+            return CommandResult(args, proc.returncode, output, elapsed)
+
+    @staticmethod
+    async def _collect(proc, lines: list, on_output: Optional[OutputCallback]):
+        while True:
+            raw = await proc.stdout.readline()
+            if not raw:
+                break
+            line = raw.decode(errors="replace")
+            lines.append(line)
+            if on_output is not None:
+                await on_output(line)
+        await proc.wait()
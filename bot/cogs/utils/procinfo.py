@@ -0,0 +1,24 @@
+"""Resource usage of the running bot process"""
+import resource
+import sys
+
+
+def rss_bytes() -> int:
+    """Current resident memory of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Highest resident memory of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_mb(num_bytes: int) -> str:
+    return f"{num_bytes / 1048576:.1f}MB"
@@ -0,0 +1,160 @@
+"""Incremental reload planning for the cogs folder
+
+Every module under `cogs/` is hashed. A reload plan contains only the
+modules whose source changed since they were last loaded, plus every loaded
+extension that imports one of them (directly or through other modules).
+
+Hashing, dependency parsing and byte-compiling are blocking, so the
+`ReloadPlanner.prepare()` step is meant to run in an executor. Only the
+final import has to happen on the event loop, and it then loads the
+already compiled bytecode.
+"""
+import ast
+import asyncio
+import hashlib
+import importlib
+import py_compile
+import sys
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+
+class ModuleInfo(NamedTuple):
+    name: str
+    path: Path
+    digest: str
+    imports: frozenset
+
+
+class ReloadPlan(NamedTuple):
+    changed: list  # names of all changed modules
+    utilities: list  # changed non-extension modules to re-import, dependencies first
+    extensions: list  # loaded extensions to reload
+    errors: dict  # module name -> compile error
+    modules: dict  # module name -> ModuleInfo, the scanned state
+
+    def __bool__(self):
+        return bool(self.utilities or self.extensions or self.errors)
+
+
+class ReloadPlanner:
+    def __init__(self, directory: str = "cogs") -> None:
+        self.directory = Path(directory)
+        self.loaded: dict[str, str] = {}  # module name -> digest of the loaded source
+        self.watch_channel: Optional[int] = None
+        self.watch_interval = 5.0
+        # Held while a plan is prepared and loaded. It lives here rather than
+        # in the management cog, because that cog reloads itself.
+        self.lock = asyncio.Lock()
+
+    def module_name(self, path: Path) -> str:
+        rel = path.relative_to(self.directory).with_suffix("")
+        return ".".join((self.directory.name,) + rel.parts)
+
+    def scan(self) -> dict:
+        """Hash and parse every module in the cogs folder (blocking)"""
+        modules = {}
+        for path in sorted(self.directory.rglob("*.py")):
+            if "samples" in path.parts:
+                continue
+            source = path.read_bytes()
+            name = self.module_name(path)
+            modules[name] = ModuleInfo(
+                name, path, hashlib.sha1(source).hexdigest(), self._imports(source)
+            )
+        return modules
+
+    @staticmethod
+    def _imports(source: bytes) -> frozenset:
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            return frozenset()
+        names = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.add(node.module)
+                names.update(f"{node.module}.{alias.name}" for alias in node.names)
+        return frozenset(n for n in names if n.startswith("cogs."))
+
+    def snapshot(self) -> None:
+        """Record the current state on disk as loaded (blocking)"""
+        self.loaded = {name: info.digest for name, info in self.scan().items()}
+
+    def prepare(self, loaded_extensions, force: bool = False) -> ReloadPlan:
+        """Build a reload plan and byte-compile the affected modules (blocking)
+
+        With `force`, every loaded extension is part of the plan.
+        """
+        modules = self.scan()
+        changed = [
+            name
+            for name, info in modules.items()
+            if self.loaded.get(name) != info.digest
+        ]
+
+        # Walk the import graph backwards to find everything depending on a change
+        affected = set(changed)
+        grew = True
+        while grew:
+            grew = False
+            for name, info in modules.items():
+                if name not in affected and info.imports & affected:
+                    affected.add(name)
+                    grew = True
+
+        loaded_extensions = set(loaded_extensions)
+        if force:
+            affected |= loaded_extensions
+        extensions = sorted(affected & loaded_extensions)
+        utilities = self._ordered(
+            [n for n in affected if n not in loaded_extensions and n in sys.modules],
+            modules,
+        )
+
+        errors = {}
+        for name in utilities + extensions:
+            if name not in modules:
+                continue
+            try:
+                py_compile.compile(str(modules[name].path), doraise=True)
+            except py_compile.PyCompileError as e:
+                errors[name] = e
+        utilities = [n for n in utilities if n not in errors]
+        extensions = [n for n in extensions if n not in errors]
+        return ReloadPlan(sorted(changed), utilities, extensions, errors, modules)
+
+    @staticmethod
+    def _ordered(names: list, modules: dict) -> list:
+        """Sort modules so that dependencies come before the modules importing them"""
+        ordered = []
+        remaining = set(names)
+
+        def visit(name, stack=()):
+            if name not in remaining or name in stack:
+                return
+            for dep in sorted(modules[name].imports if name in modules else ()):
+                visit(dep, stack + (name,))
+            remaining.discard(name)
+            ordered.append(name)
+
+        for name in sorted(names):
+            visit(name)
+        return ordered
+
+    def mark_current(self, name: str) -> None:
+        """Record a single module as loaded at its current version on disk (blocking)"""
+        path = self.directory.joinpath(*name.split(".")[1:]).with_suffix(".py")
+        if path.is_file():
+            self.loaded[name] = hashlib.sha1(path.read_bytes()).hexdigest()
+
+    def reload_utility(self, name: str) -> None:
+        importlib.reload(sys.modules[name])
+
+    def mark_loaded(self, plan: ReloadPlan, names) -> None:
+        """Record the given modules of a plan as loaded at their scanned version"""
+        for name in names:
+            if name in plan.modules:
+                self.loaded[name] = plan.modules[name].digest
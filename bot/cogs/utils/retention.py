@@ -0,0 +1,170 @@
+"""Retention engine for the image download directory
+
+Files in `save_dir` are evicted when they are older than `max_age_days`,
+or, least recently used first, while the directory is larger than `max_size_mb`.
+A file's last use is the later of its modification and access time.
+The bot only reads saved files back for contact sheets (`ls sheet`), which
+mark the files they show with `touch()`; `send` forwards the Discord URL
+and never opens the saved copy. Access times are not kept up to date by
+reads on relatime/noatime mounts (usual for SD cards), but `touch()` sets
+them explicitly, so for files that were never put on a sheet the order is
+in effect oldest saved first.
+
+Deletes are done in small batches on a worker thread with a pause between
+batches, so an eviction pass never blocks the event loop or a running `save`.
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+
+class FileEntry(NamedTuple):
+    path: Path
+    size: int
+    mtime: float
+    last_display: float
+
+
+class Eviction(NamedTuple):
+    entry: FileEntry
+    reason: str
+
+
+class RetentionPolicy:
+    """Limits applied to the download directory.
+
+    A limit set to `None` is not enforced.
+    Files modified less than `grace_seconds` ago are never touched,
+    so a file that is still being written by `save` can't be removed.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        grace_seconds: float = 60,
+        deletes_per_batch: int = 5,
+        batch_interval: float = 1.0,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.grace_seconds = grace_seconds
+        self.deletes_per_batch = max(1, deletes_per_batch)
+        self.batch_interval = batch_interval
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RetentionPolicy":
+        """Build a policy from the "retention" section of config.json"""
+        conf = config.get("retention", {})
+        max_size_mb = conf.get("max_size_mb")
+        max_age_days = conf.get("max_age_days")
+        return cls(
+            max_bytes=int(max_size_mb * 1024 * 1024) if max_size_mb else None,
+            max_age=max_age_days * 86400 if max_age_days else None,
+            grace_seconds=conf.get("grace_seconds", 60),
+            deletes_per_batch=conf.get("deletes_per_batch", 5),
+            batch_interval=conf.get("batch_interval", 1.0),
+        )
+
+
+def touch(path: Path) -> None:
+    """Mark a file as used right now (updates its access time only)"""
+    try:
+        stat = path.stat()
+        os.utime(path, (time.time(), stat.st_mtime))
+    except OSError:
+        pass
+
+
+def scan(directory: Path) -> list[FileEntry]:
+    """List the files in the download directory, skipping hidden files and folders"""
+    entries = []
+    if not directory.is_dir():
+        return entries
+    with os.scandir(directory) as it:
+        for item in it:
+            if item.name.startswith(".") or not item.is_file(follow_symlinks=False):
+                continue
+            try:
+                stat = item.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            entries.append(
+                FileEntry(
+                    Path(item.path),
+                    stat.st_size,
+                    stat.st_mtime,
+                    max(stat.st_atime, stat.st_mtime),
+                )
+            )
+    return entries
+
+
+def plan(
+    entries: Iterable[FileEntry], policy: RetentionPolicy, now: float = None
+) -> list[Eviction]:
+    """Decide which files have to go, without deleting anything
+
+    Expired files are listed first, then the least recently displayed files
+    until the directory fits into `policy.max_bytes`.
+    """
+    now = time.time() if now is None else now
+    candidates = [e for e in entries if now - e.mtime >= policy.grace_seconds]
+    total = sum(e.size for e in entries)
+    evictions = []
+
+    if policy.max_age is not None:
+        keep = []
+        for entry in candidates:
+            if now - entry.mtime > policy.max_age:
+                evictions.append(Eviction(entry, "age"))
+                total -= entry.size
+            else:
+                keep.append(entry)
+        candidates = keep
+
+    if policy.max_bytes is not None and total > policy.max_bytes:
+        for entry in sorted(candidates, key=lambda e: e.last_display):
+            if total <= policy.max_bytes:
+                break
+            evictions.append(Eviction(entry, "size"))
+            total -= entry.size
+
+    return evictions
+
+
+async def evict(evictions: list[Eviction], policy: RetentionPolicy) -> list[Eviction]:
+    """Delete the planned files in rate-limited batches
+
+    Returns the evictions that were actually carried out.
+    """
+    loop = asyncio.get_running_loop()
+    done = []
+    step = policy.deletes_per_batch
+    for start in range(0, len(evictions), step):
+        batch = evictions[start : start + step]
+        removed = await loop.run_in_executor(None, _remove_batch, batch)
+        done += removed
+        if start + step < len(evictions):
+            await asyncio.sleep(policy.batch_interval)
+    return done
+
+
+def _remove_batch(batch: list[Eviction]) -> list[Eviction]:
+    removed = []
+    for eviction in batch:
+        try:
+            eviction.entry.path.unlink()
+        except FileNotFoundError:
+            continue
+        removed.append(eviction)
+    return removed
+
+
+def format_size(num_bytes: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:.1f}{unit}" if unit != "B" else f"{num_bytes}B"
+        num_bytes /= 1024
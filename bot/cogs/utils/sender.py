@@ -0,0 +1,205 @@
+"""Outbound message sender shared by all cogs
+
+Commands that produce a lot of output (error lists, tracebacks, git, ls)
+used to send it as many small messages. Discord allows about 5 messages per
+5 seconds in a channel, so they ran into the rate limit and then waited on
+it one message at a time. `Sender.send` instead:
+
+    - packs the lines of the output into as few 2000 character messages as
+      possible, keeping code block formatting on every message
+    - sends the output as a file when it would take more than
+      `max_messages` messages
+    - paces the messages of each channel so they stay within the
+      rate limit, instead of hitting it and waiting for a 429
+    - sends one output at a time per channel, so the output of two
+      commands never interleaves
+
+`fit_embed` truncates an embed to Discord's embed limits.
+"""
+
+import asyncio
+import io
+import time
+from typing import Optional
+
+from discord import Embed, File
+
+MESSAGE_LIMIT = 2000
+EMBED_TITLE_LIMIT = 256
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_FIELD_LIMIT = 1024
+EMBED_FOOTER_LIMIT = 2048
+EMBED_TOTAL_LIMIT = 6000
+
+
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def pack(text: str, limit: int = MESSAGE_LIMIT, lang: Optional[str] = None) -> list:
+    """Split text at line breaks into as few chunks of at most `limit` characters
+
+    With `lang`, every chunk is wrapped in a code block of that language.
+    Lines longer than a chunk are split.
+    """
+    prefix, suffix = (f"```{lang}\n", "\n```") if lang is not None else ("", "")
+    room = limit - len(prefix) - len(suffix)
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        while len(line) > room:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:room])
+            line = line[room:]
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= room:
+            current += "\n" + line
+        else:
+            chunks.append(current)
+            current = line
+    if current or not chunks:
+        chunks.append(current)
+    return [prefix + chunk + suffix for chunk in chunks]
+
+
+def fit_embed(embed: Embed) -> Embed:
+    """Truncate the parts of an embed to Discord's limits, in place
+
+    When the whole embed is too long, trailing fields are dropped first and
+    then the description is shortened.
+    """
+    if embed.title:
+        embed.title = truncate(embed.title, EMBED_TITLE_LIMIT)
+    if embed.footer.text:
+        embed.set_footer(
+            text=truncate(embed.footer.text, EMBED_FOOTER_LIMIT),
+            icon_url=embed.footer.icon_url,
+        )
+    for i, field in enumerate(embed.fields):
+        embed.set_field_at(
+            i,
+            name=truncate(field.name, EMBED_TITLE_LIMIT),
+            value=truncate(field.value, EMBED_FIELD_LIMIT),
+            inline=field.inline,
+        )
+    # Trailing fields are dropped until the rest fits without the description
+    description_length = len(embed.description) if embed.description else 0
+    while embed.fields and len(embed) - description_length > EMBED_TOTAL_LIMIT:
+        embed.remove_field(len(embed.fields) - 1)
+    if embed.description:
+        description = truncate(embed.description, EMBED_DESCRIPTION_LIMIT)
+        # The description gives way when the embed as a whole is too long
+        excess = len(embed) - len(embed.description) + len(description)
+        excess -= EMBED_TOTAL_LIMIT
+        if excess > 0:
+            description = truncate(description, max(3, len(description) - excess))
+        embed.description = description
+    return embed
+
+
+class ChannelPacer:
+    """A token bucket allowing `rate` messages per `per` seconds"""
+
+    def __init__(self, rate: int, per: float) -> None:
+        self.rate = rate
+        self.per = per
+        self.allowance = float(rate)
+        self.last = time.monotonic()
+        self.lock = asyncio.Lock()  # Held for a whole output, see Sender.send
+
+    async def wait(self):
+        now = time.monotonic()
+        self.allowance = min(
+            self.rate, self.allowance + (now - self.last) * self.rate / self.per
+        )
+        self.last = now
+        if self.allowance < 1:
+            await asyncio.sleep((1 - self.allowance) * self.per / self.rate)
+            self.allowance = 1
+            self.last = time.monotonic()
+        self.allowance -= 1
+
+
+class Sender:
+    def __init__(self, max_messages: int = 3, rate: int = 5, per: float = 5) -> None:
+        self.max_messages = max_messages
+        self.rate = rate
+        self.per = per
+        self._pacers: dict[int, ChannelPacer] = {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Sender":
+        conf = config.get("sender", {})
+        return cls(
+            max_messages=conf.get("max_messages", 3),
+            rate=conf.get("rate", 5),
+            per=conf.get("per", 5),
+        )
+
+    def pacer(self, destination) -> ChannelPacer:
+        # A Context sends to its channel, anything else is the channel itself
+        channel = getattr(destination, "channel", destination)
+        key = getattr(channel, "id", id(channel))
+        pacer = self._pacers.get(key)
+        if pacer is None:
+            if len(self._pacers) > 100:
+                self._forget_idle()
+            pacer = self._pacers[key] = ChannelPacer(self.rate, self.per)
+        return pacer
+
+    def _forget_idle(self):
+        now = time.monotonic()
+        for key, pacer in list(self._pacers.items()):
+            if now - pacer.last > self.per and not pacer.lock.locked():
+                del self._pacers[key]
+
+    async def send(
+        self,
+        destination,
+        text: str = "",
+        *,
+        lang: Optional[str] = None,
+        header: Optional[str] = None,
+        embed: Optional[Embed] = None,
+        files: list = (),
+        filename: str = "output.txt",
+        max_messages: Optional[int] = None,
+    ) -> list:
+        """Send `text` in as few messages as possible, or as a file
+
+        `header` goes in front of the first message, outside the code block.
+        `embed` and `files` go with the last message.
+        Returns the sent messages.
+        """
+        max_messages = self.max_messages if max_messages is None else max_messages
+        files = list(files)
+        chunks = pack(text, lang=lang) if text else []
+        if header:
+            if chunks and len(header) + 1 + len(chunks[0]) <= MESSAGE_LIMIT:
+                chunks[0] = header + "\n" + chunks[0]
+            else:
+                chunks[:0] = pack(header)
+        if len(chunks) > max_messages:
+            files.insert(0, File(io.BytesIO(text.encode()), filename=filename))
+            chunks = [
+                truncate(header or f"Output attached as `{filename}`", MESSAGE_LIMIT)
+            ]
+        if not chunks:
+            chunks = [None]
+
+        pacer = self.pacer(destination)
+        sent = []
+        async with pacer.lock:
+            for i, chunk in enumerate(chunks):
+                last = i == len(chunks) - 1
+                await pacer.wait()
+                sent.append(
+                    await destination.send(
+                        chunk,
+                        embed=fit_embed(embed) if last and embed else None,
+                        files=files if last and files else None,
+                    )
+                )
+        return sent
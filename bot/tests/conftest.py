@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The bot runs from the bot/ folder and imports its modules as `cogs.*`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
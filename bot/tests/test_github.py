@@ -0,0 +1,120 @@
+"""CommitHistory against a local stub of the GitHub commits API"""
+
+import asyncio
+
+from aiohttp import ClientSession, web
+
+from cogs.utils.github import CommitHistory
+
+PER_PAGE = 5
+
+
+class StubGitHub:
+    """Serves /repos/{owner}/{repo}/commits from a list of SHAs, newest first"""
+
+    def __init__(self, num_commits: int) -> None:
+        self.shas = [f"c{i}" for i in range(num_commits, 0, -1)]
+        self.requests = []  # (page, If-None-Match) of every request
+        app = web.Application()
+        app.router.add_get("/repos/{owner}/{repo}/commits", self.commits)
+        self.runner = web.AppRunner(app)
+        self.root = None
+
+    def push(self, count: int):
+        newest = len(self.shas)
+        self.shas[:0] = [f"c{i}" for i in range(newest + count, newest, -1)]
+
+    async def start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.root = f"http://127.0.0.1:{port}"
+
+    async def commits(self, request):
+        page = int(request.query.get("page", 1))
+        per_page = int(request.query["per_page"])
+        etag = f'"{self.shas[0]}-{page}"'
+        self.requests.append((page, request.headers.get("If-None-Match")))
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        shas = self.shas[(page - 1) * per_page : page * per_page]
+        headers = {"ETag": etag}
+        if page * per_page < len(self.shas):
+            url = f"{self.root}{request.path}?per_page={per_page}&page={page + 1}"
+            headers["Link"] = f'<{url}>; rel="next"'
+        return web.json_response([{"sha": sha} for sha in shas], headers=headers)
+
+
+def run(num_commits: int, scenario):
+    """Run `scenario(stub, history)` against a stub with `num_commits` commits"""
+
+    async def main():
+        stub = StubGitHub(num_commits)
+        await stub.start()
+        try:
+            async with ClientSession() as session:
+                history = CommitHistory(
+                    session, "owner/repo", per_page=PER_PAGE, api_root=stub.root
+                )
+                return await scenario(stub, history)
+        finally:
+            await stub.runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_first_fetch_reads_one_page():
+    async def scenario(stub, history):
+        num, commits = await history.commits_since("c18", min_count=3)
+        assert num == 2
+        assert [c["sha"] for c in commits] == ["c20", "c19", "c18"]
+        assert stub.requests == [(1, None)]
+
+    run(20, scenario)
+
+
+def test_unchanged_repo_revalidates_with_304():
+    async def scenario(stub, history):
+        await history.commits_since("c20")
+        history.fetched_at = 0  # TTL expired
+        num, _ = await history.commits_since("c20")
+        assert num == 0
+        assert stub.requests == [(1, None), (1, '"c20-1"')]
+
+    run(20, scenario)
+
+
+def test_catches_up_over_more_than_a_page_of_new_commits():
+    async def scenario(stub, history):
+        await history.commits_since("c20")
+        stub.push(7)
+        history.fetched_at = 0
+        num, commits = await history.commits_since("c20")
+        assert num == 7
+        assert [c["sha"] for c in commits] == [f"c{i}" for i in range(27, 20, -1)]
+        # The newest two pages, no older history
+        assert [page for page, _ in stub.requests] == [1, 1, 2]
+
+    run(20, scenario)
+
+
+def test_local_commit_newer_than_cache_forces_refresh():
+    async def scenario(stub, history):
+        await history.commits_since("c300")
+        stub.push(1)
+        # A pull within the TTL: the local head is c301, the cache ends at c300
+        num, _ = await history.commits_since("c301")
+        assert num == 0
+        assert [page for page, _ in stub.requests] == [1, 1]
+
+    run(300, scenario)
+
+
+def test_unknown_sha_counts_every_commit():
+    async def scenario(stub, history):
+        num, commits = await history.commits_since("not-pushed")
+        assert num == 12
+        assert len(commits) == 12
+
+    run(12, scenario)
@@ -0,0 +1,68 @@
+"""Message packing and embed limits of the shared sender"""
+
+from discord import Embed
+
+from cogs.utils.sender import (
+    EMBED_DESCRIPTION_LIMIT,
+    EMBED_TOTAL_LIMIT,
+    MESSAGE_LIMIT,
+    fit_embed,
+    pack,
+)
+
+
+def test_pack_keeps_lines_together():
+    lines = [f"line {i}" for i in range(1000)]
+    chunks = pack("\n".join(lines))
+    assert all(len(chunk) <= MESSAGE_LIMIT for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == lines
+
+
+def test_pack_wraps_every_chunk_in_a_code_block():
+    chunks = pack("x\n" * 3000, lang="py")
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= MESSAGE_LIMIT
+        assert chunk.startswith("```py\n") and chunk.endswith("\n```")
+
+
+def test_pack_splits_long_lines():
+    chunks = pack("a" * (MESSAGE_LIMIT * 2 + 10))
+    assert [len(chunk) for chunk in chunks] == [MESSAGE_LIMIT, MESSAGE_LIMIT, 10]
+
+
+def test_pack_empty_text():
+    assert pack("") == [""]
+
+
+def test_fit_embed_truncates_description():
+    embed = fit_embed(Embed(title="t", description="d" * 5000))
+    assert len(embed.description) == EMBED_DESCRIPTION_LIMIT
+    assert embed.description.endswith("...")
+
+
+def test_fit_embed_drops_trailing_fields():
+    embed = Embed(title="t" * 300)
+    for i in range(6):
+        embed.add_field(name=f"field {i}", value="v" * 1100)
+    fit_embed(embed)
+    assert len(embed) <= EMBED_TOTAL_LIMIT
+    assert len(embed.title) == 256
+    assert [field.name for field in embed.fields] == [f"field {i}" for i in range(5)]
+
+
+def test_fit_embed_shortens_description_after_fields():
+    embed = Embed(description="d" * 4000)
+    for i in range(3):
+        embed.add_field(name=f"field {i}", value="v" * 1000)
+    fit_embed(embed)
+    assert len(embed) == EMBED_TOTAL_LIMIT
+    assert len(embed.fields) == 3
+
+
+def test_fit_embed_leaves_small_embeds_alone():
+    embed = Embed(title="title", description="description")
+    embed.add_field(name="name", value="value")
+    embed.set_footer(text="footer")
+    before = embed.to_dict()
+    assert fit_embed(embed).to_dict() == before
@@ -5,6 +5,9 @@ import json
 
 import queue
 
+from capture import recorder_from_env
+from search import COUNT_LIMIT, index_from_env
+
 
 class MessageAnnouncer:
     """
@@ -63,15 +66,20 @@ def format_sse(data: str, event: str = None) -> str:
 
 app = Flask(__name__)
 images: list[dict] = []
+recorder = recorder_from_env()  # Set CAPTURE_TRACE=<file> to record traffic
+captions = index_from_env()  # Full-text index of the image messages
 
 
 TIME_FORMAT = "%Y-%m-%d-%H-%M-%S"
+KEEPALIVE_INTERVAL = 15  # seconds
 images.append(
     dict(
         url="https://cdn.discordapp.com/attachments/860987957363998751/862069898610999306/5556-stonks.png",
         date=time.strftime(TIME_FORMAT),
     )
 )
+if len(captions) == 0:  # A SEARCH_INDEX file keeps it from the last run
+    captions.add(images[0]["url"], None, images[0]["date"])
 
 
 @app.route("/")
@@ -98,9 +106,27 @@ def msg_stream():
     # https://flask.palletsprojects.com/en/latest/patterns/streaming/
     def stream():
         messages = announcer.listen()  # Returns a Queue that will fill with messages
-        while True:
-            msg = messages.get()  # Blocks the thread until a new message has arrived
-            yield msg
+        client_id = None
+        if recorder is not None:
+            client_id = recorder.next_client_id()
+            recorder.record("subscribe", client=client_id)
+        try:
+            # Flask only sends the response headers with the first chunk,
+            # so send one right away to open the stream for the client
+            yield ": connected\n\n"
+            while True:
+                try:
+                    # Blocks the thread until a new message has arrived
+                    msg = messages.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    # An SSE comment, ignored by the browser. Writing it is
+                    # the only way to notice a client that has gone away.
+                    msg = ": keepalive\n\n"
+                yield msg
+        finally:
+            # Runs when the client goes away and the generator is closed
+            if recorder is not None:
+                recorder.record("disconnect", client=client_id)
 
     # The "text/event-stream" MIME-type is special
     return Response(stream(), mimetype="text/event-stream")
@@ -112,6 +138,31 @@ def api_image_get():
     return data
 
 
+@app.route("/api/v1/search", methods=["GET"])
+def api_image_search():
+    """
+    Search the image messages, see search.py for the query syntax
+
+    Query parameters: q, since, until, page (from 1), per_page
+    """
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = min(max(1, request.args.get("per_page", 10, type=int)), 100)
+    total, results = captions.search(
+        request.args.get("q", ""),
+        since=request.args.get("since"),
+        until=request.args.get("until"),
+        limit=per_page,
+        offset=(page - 1) * per_page,
+    )
+    # Past COUNT_LIMIT matches, total and pages are lower bounds
+    more = total > COUNT_LIMIT
+    total = min(total, COUNT_LIMIT)
+    pages = max(1, -(-total // per_page))
+    return dict(
+        success=True, total=total, more=more, page=page, pages=pages, data=results
+    )
+
+
 @app.route("/api/v1/send_image", methods=["POST"])
 def api_image_post():
     # Get posted data
@@ -119,11 +170,14 @@ def api_image_post():
     url = content.get("url")
     msg = content.get("text")
     msg_time = time.strftime(TIME_FORMAT)
+    if recorder is not None:
+        recorder.record("send_image", url=url, text=msg)
 
     image_meta = dict(url=url, message=msg, date=msg_time)
 
     # Save posted messages locally
     images.append(image_meta)
+    captions.add(url, msg, msg_time)
     # And also format for SSE client
     sse_msg = format_sse(event="new_msg", data=json.dumps(image_meta))
 
@@ -0,0 +1,44 @@
+"""
+Traffic capture for performance regression testing
+
+When the `CAPTURE_TRACE` environment variable names a file, every
+`send_image` request and every SSE subscribe/disconnect is appended to it
+as one JSON object per line (NDJSON), with a wall clock timestamp.
+The trace can be replayed against another build with `replay.py`.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+
+
+class TraceRecorder:
+    """
+    Append events to an NDJSON trace file, safe to call from any request thread
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def next_client_id(self) -> int:
+        return next(self._ids)
+
+    def record(self, event: str, **fields) -> None:
+        line = json.dumps(dict(ts=time.time(), event=event, **fields))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def recorder_from_env():
+    """Return a `TraceRecorder` if capture mode is enabled, else None"""
+    path = os.environ.get("CAPTURE_TRACE")
+    return TraceRecorder(path) if path else None
@@ -0,0 +1,284 @@
+"""
+Replay a captured traffic trace against a running server
+
+Record a trace by starting the server with CAPTURE_TRACE=<file>, then:
+
+    python replay.py run trace.ndjson --target http://127.0.0.1:5000 \
+        --speed 10 --out new.json
+    python replay.py compare old.json new.json
+
+`--speed` is a time multiplier (1 = real time, 10 = ten times faster,
+0 = as fast as possible). Each `send_image` is re-posted, and each SSE
+subscriber is re-created and kept connected for its recorded lifetime,
+so the report can show post latency, SSE delivery latency and how many
+messages subscribers missed (drops).
+Only the standard library is used, so this runs anywhere the server does.
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+SEND_ENDPOINT = "/api/v1/send_image"
+STREAM_ENDPOINT = "/stream/listen"
+
+
+def percentiles(values: list) -> dict:
+    """p50/p95/p99/max of a list of seconds, in milliseconds"""
+    if not values:
+        return dict(p50=None, p95=None, p99=None, max=None)
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000
+
+    return dict(p50=pick(50), p95=pick(95), p99=pick(99), max=ordered[-1] * 1000)
+
+
+class Subscriber(threading.Thread):
+    """
+    A raw-socket SSE client, so it can be disconnected at an exact moment
+    """
+
+    def __init__(self, target: str, client_id) -> None:
+        super().__init__(daemon=True)
+        self.target = urlsplit(target)
+        self.client_id = client_id
+        self.connected = threading.Event()
+        self.connected_at = None
+        self.disconnected_at = None
+        self.received = []  # (receive time, event data)
+        self._stop_flag = threading.Event()
+
+    def run(self):
+        host, port = self.target.hostname, self.target.port or 80
+        with socket.create_connection((host, port), timeout=5) as sock:
+            request = f"GET {STREAM_ENDPOINT} HTTP/1.0\r\nHost: {host}\r\n\r\n"
+            sock.sendall(request.encode())
+            sock.settimeout(0.2)
+            buffer = b""
+            headers_done = False
+            while True:
+                stopping = self._stop_flag.is_set()
+                try:
+                    chunk = sock.recv(65536)
+                except socket.timeout:
+                    if stopping:
+                        break
+                    continue
+                if not chunk:
+                    break
+                buffer += chunk
+                if not headers_done:
+                    if b"\r\n\r\n" not in buffer:
+                        continue
+                    buffer = buffer.split(b"\r\n\r\n", 1)[1]
+                    headers_done = True
+                    self.connected_at = time.perf_counter()
+                    self.connected.set()
+                while b"\n\n" in buffer:
+                    block, buffer = buffer.split(b"\n\n", 1)
+                    self._handle_block(block.decode(errors="replace"))
+                if stopping:
+                    break  # One last read for messages already on the way
+        if self.disconnected_at is None:
+            self.disconnected_at = time.perf_counter()
+        self.connected.set()  # Don't leave the replay waiting on a failed connect
+
+    def _handle_block(self, block: str):
+        event, data = None, None
+        for line in block.split("\n"):
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = line[5:].strip()
+        if event == "new_msg" and data:
+            self.received.append((time.perf_counter(), json.loads(data)))
+
+    def disconnect(self):
+        self.disconnected_at = time.perf_counter()
+        self._stop_flag.set()
+
+
+def post_image(target: str, url: str, text) -> tuple:
+    """Re-post one image, returns (send time, latency, ok)"""
+    body = json.dumps(dict(url=url, text=text)).encode()
+    request = urllib.request.Request(
+        target + SEND_ENDPOINT,
+        data=body,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    sent = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            ok = response.status == 200
+    except OSError:
+        ok = False
+    return sent, time.perf_counter() - sent, ok
+
+
+def load_trace(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return sorted(events, key=lambda e: e["ts"])
+
+
+def replay(trace: list, target: str, speed: float, drain: float) -> dict:
+    subscribers = {}
+    posts = []  # futures of post_image
+    start = time.perf_counter()
+    t0 = trace[0]["ts"] if trace else 0
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        for event in trace:
+            if speed > 0:
+                delay = start + (event["ts"] - t0) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            kind = event["event"]
+            if kind == "send_image":
+                posts.append(
+                    pool.submit(post_image, target, event["url"], event["text"])
+                )
+            elif kind == "subscribe":
+                if speed == 0:
+                    # Posts sent before the subscribe must not reach the
+                    # new subscriber, the recorded one never saw them
+                    for future in posts:
+                        future.result()
+                sub = Subscriber(target, event["client"])
+                subscribers[event["client"]] = sub
+                sub.start()
+                sub.connected.wait(timeout=5)
+            elif kind == "disconnect" and event["client"] in subscribers:
+                # Posts sent before the disconnect must reach the subscriber
+                # first, otherwise --speed 0 would count them as drops
+                for future in posts:
+                    future.result()
+                subscribers[event["client"]].disconnect()
+        results = [future.result() for future in posts]
+
+    time.sleep(drain)  # Let the last messages reach the subscribers
+    for sub in subscribers.values():
+        if sub.disconnected_at is None:
+            sub.disconnect()
+    duration = time.perf_counter() - start
+
+    # A subscriber should have received every post sent while it was connected.
+    # Drops are counted per subscriber and message, so a message that arrives
+    # unexpectedly (sent just before it connected) can't hide a missing one.
+    sent_posts = [
+        (sent, (event["url"], event["text"]))
+        for (sent, _, ok), event in zip(
+            results, (e for e in trace if e["event"] == "send_image")
+        )
+        if ok
+    ]
+    sent_by_key = {}
+    for sent, key in sent_posts:
+        sent_by_key.setdefault(key, []).append(sent)
+    expected = received = drops = 0
+    delivery = []
+    for sub in subscribers.values():
+        if sub.connected_at is None:
+            continue
+        window = Counter(
+            key
+            for sent, key in sent_posts
+            if sub.connected_at <= sent < sub.disconnected_at
+        )
+        got = Counter(
+            (data.get("url"), data.get("message")) for _, data in sub.received
+        )
+        expected += sum(window.values())
+        received += len(sub.received)
+        drops += sum((window - got).values())
+        for recv_time, data in sub.received:
+            candidates = [
+                s
+                for s in sent_by_key.get((data.get("url"), data.get("message")), [])
+                if s <= recv_time
+            ]
+            if candidates:
+                delivery.append(recv_time - max(candidates))
+
+    latencies = [latency for _, latency, ok in results if ok]
+    return dict(
+        target=target,
+        speed=speed,
+        duration=duration,
+        posts=len(results),
+        post_errors=sum(1 for _, _, ok in results if not ok),
+        post_latency_ms=percentiles(latencies),
+        subscribers=len(subscribers),
+        expected=expected,
+        received=received,
+        drops=drops,
+        drop_rate=drops / expected if expected else 0.0,
+        delivery_latency_ms=percentiles(delivery),
+    )
+
+
+def flatten(result: dict, prefix="") -> dict:
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old: dict, new: dict) -> str:
+    """A table of every numeric metric in both runs, with the change"""
+    old_flat, new_flat = flatten(old), flatten(new)
+    lines = [f"{'metric':<28} {'old':>10} {'new':>10} {'change':>9}"]
+    for key in old_flat.keys() | new_flat.keys():
+        a, b = old_flat.get(key), new_flat.get(key)
+        if a is None or b is None:
+            continue
+        change = f"{(b - a) / a:+.0%}" if a else ""
+        lines.append(f"{key:<28} {a:>10.2f} {b:>10.2f} {change:>9}")
+    return "\n".join([lines[0]] + sorted(lines[1:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured traffic trace")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="replay a trace against a server")
+    run_parser.add_argument("trace")
+    run_parser.add_argument("--target", default="http://127.0.0.1:5000")
+    run_parser.add_argument(
+        "--speed", type=float, default=1, help="1 = real time, 0 = as fast as possible"
+    )
+    run_parser.add_argument(
+        "--drain", type=float, default=2, help="seconds to wait at the end"
+    )
+    run_parser.add_argument("--out", help="write the result as JSON")
+    compare_parser = commands.add_parser("compare", help="compare two replay results")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.old) as a, open(args.new) as b:
+            print(compare(json.load(a), json.load(b)))
+        return
+
+    result = replay(load_trace(args.trace), args.target, args.speed, args.drain)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
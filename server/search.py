@@ -0,0 +1,132 @@
+"""
+Full-text search over image captions
+
+Every posted image is added to an SQLite FTS5 index as it arrives, so a
+search never has to scan the whole image list. Each word of a query
+matches as a prefix ("cat" finds "cats" and "caterpillar"), all words
+must match, and the newest images come first. Results can be limited to a
+date range, either with the `since`/`until` arguments or with `since:` and
+`until:` in the query:
+
+    birthday cake since:2021-07 until:2021-08-15
+
+Dates use the server's TIME_FORMAT ("%Y-%m-%d-%H-%M-%S"), which sorts as
+text, so any leading part of it ("2021", "2021-07-04") works as a bound.
+
+The index lives in memory like the image list, unless the SEARCH_INDEX
+environment variable names a database file.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+
+WORD_RE = re.compile(r"\w+")
+FILTER_RE = re.compile(r"\b(since|until):(\S+)")
+# Relevance ranking scores every match (tens of milliseconds for a common
+# word at 100k captions), so results are newest first, and counting stops here
+COUNT_LIMIT = 1000
+
+
+def parse_query(query: str) -> tuple:
+    """Split a query into (words, since, until)"""
+    filters = dict(FILTER_RE.findall(query or ""))
+    words = WORD_RE.findall(FILTER_RE.sub(" ", query or ""))
+    return words, filters.get("since"), filters.get("until")
+
+
+class CaptionIndex:
+    """
+    An incremental FTS5 index of image captions, safe to use from any request thread
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                message TEXT,
+                date TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS images_date ON images(date);
+            -- Prefix indexes make short prefix queries index lookups
+            CREATE VIRTUAL TABLE IF NOT EXISTS captions USING fts5(
+                message, content='images', content_rowid='id', prefix='1 2 3'
+            );
+            """)
+
+    def add(self, url: str, message: str, date: str) -> int:
+        with self._lock, self._db:
+            row_id = self._db.execute(
+                "INSERT INTO images (url, message, date) VALUES (?, ?, ?)",
+                (url, message, date),
+            ).lastrowid
+            if message:
+                self._db.execute(
+                    "INSERT INTO captions (rowid, message) VALUES (?, ?)",
+                    (row_id, message),
+                )
+        return row_id
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM images").fetchone()[0]
+
+    def search(
+        self,
+        query: str = "",
+        since: str = None,
+        until: str = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> tuple:
+        """
+        Return (number of matches, one page of matches), newest first
+
+        The number of matches is counted up to COUNT_LIMIT only, a larger
+        count is returned as COUNT_LIMIT + 1.
+        """
+        words, q_since, q_until = parse_query(query)
+        since, until = since or q_since, until or q_until
+
+        conditions, args = [], []
+        if words:
+            # Quoting every word keeps FTS5 operators in the input literal
+            conditions.append("captions MATCH ?")
+            args.append(" ".join(f'"{word}"*' for word in words))
+        if since:
+            conditions.append("images.date >= ?")
+            args.append(since)
+        if until:
+            # "~" sorts after every digit, so "until:2021-07" includes all of July
+            conditions.append("images.date <= ?")
+            args.append(until + "~")
+
+        if words:
+            source = "captions JOIN images ON images.id = captions.rowid"
+            order = "captions.rowid DESC"
+        else:
+            source = "images"
+            order = "images.id DESC"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            # Counting stops at COUNT_LIMIT, so a common word costs no
+            # more than a rare one
+            total = self._db.execute(
+                f"SELECT count(*) FROM (SELECT 1 FROM {source} {where} LIMIT ?)",
+                args + [COUNT_LIMIT + 1],
+            ).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT images.url, images.message, images.date FROM {source}"
+                f" {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                args + [limit, offset],
+            ).fetchall()
+        return total, [dict(url=url, message=msg, date=date) for url, msg, date in rows]
+
+
+def index_from_env() -> CaptionIndex:
+    return CaptionIndex(os.environ.get("SEARCH_INDEX", ":memory:"))
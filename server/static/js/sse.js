@@ -1,3 +1,14 @@
+// Display modes, picked with URL parameters:
+//   /                    list: a new link for every image, kept forever
+//   /?mode=window        window: only the newest images, shown in a fixed set
+//                        of recycled DOM nodes. Meant for the kiosk, which
+//                        runs for weeks without a reload.
+//   /?mode=window&size=8 number of images in the window (default 5)
+//   &stats=1             log frame times and memory to the console every minute
+const params = new URLSearchParams(window.location.search);
+const MODE = params.get("mode") || "list";
+const WINDOW_SIZE = Math.max(1, parseInt(params.get("size"), 10) || 5);
+
 const source = new EventSource("/stream/listen");
 
 // source.onopen = () => console.log('Connection requested')
@@ -6,7 +17,21 @@ source.onmessage = function (event) {
     console.log(event);
 }
 
-source.addEventListener("new_msg", displayEvent);
+if (MODE === "window") {
+    document.addEventListener("DOMContentLoaded", () => {
+        const feed = new WindowedFeed(document.getElementById("events"), WINDOW_SIZE);
+        source.addEventListener("new_msg", (event) => feed.push(JSON.parse(event.data)));
+        if (params.get("stats")) {
+            logStats();
+        }
+    });
+} else {
+    source.addEventListener("new_msg", displayEvent);
+}
+
+function caption(dataObj) {
+    return `${dataObj.date}${((dataObj.message)) ? " -- " + dataObj.message : ""}`;
+}
 
 function displayEvent(event) {
     const li = document.createElement("li");
@@ -15,8 +40,116 @@ function displayEvent(event) {
 
     const dataObj = JSON.parse(event.data);
     a.href = dataObj.url;
-    const text = document.createTextNode(`${dataObj.date}${((dataObj.message)) ? " -- " + dataObj.message : ""}`);
+    const text = document.createTextNode(caption(dataObj));
     a.appendChild(text);
     li.appendChild(a);
     list.appendChild(li);
-}
\ No newline at end of file
+}
+
+/**
+ * A fixed number of `<li>` items, each with a link and an image.
+ *
+ * Every node is created once. A new image is loaded and decoded in a spare
+ * `<img>` first (`img.decode()` decodes off the main thread), then swapped
+ * with the image of the oldest item, which becomes the next spare. The
+ * oldest item is moved to the end of the list, so the DOM never grows and
+ * the swap itself costs no decoding on the frame it happens in.
+ */
+class WindowedFeed {
+    constructor(list, size) {
+        this.list = list;
+        this.size = size;
+        this.pending = [];  // Images waiting to be decoded, oldest first
+        this.busy = false;
+        this.spare = this.createImage();
+
+        list.replaceChildren();
+        list.classList.add("window");
+        for (let i = 0; i < size; i++) {
+            const li = document.createElement("li");
+            const a = document.createElement("a");
+            li.hidden = true;  // Until it shows an image
+            li.appendChild(this.createImage());
+            li.appendChild(a);
+            list.appendChild(li);
+        }
+    }
+
+    createImage() {
+        const img = new Image();
+        img.decoding = "async";
+        img.alt = "";
+        return img;
+    }
+
+    push(dataObj) {
+        this.pending.push(dataObj);
+        // Images that would scroll out of the window before they are shown
+        // are never decoded
+        if (this.pending.length > this.size) {
+            this.pending.splice(0, this.pending.length - this.size);
+        }
+        if (!this.busy) {
+            this.next();
+        }
+    }
+
+    async next() {
+        this.busy = true;
+        while (this.pending.length > 0) {
+            const dataObj = this.pending.shift();
+            const img = this.spare;
+            img.src = dataObj.url;
+            let decoded = true;
+            try {
+                await img.decode();
+            } catch (err) {
+                decoded = false;  // Still show the caption and link
+                console.warn(`Failed to decode ${dataObj.url}`, err);
+            }
+            await new Promise((resolve) => requestAnimationFrame(resolve));
+            this.show(dataObj, img, decoded);
+        }
+        this.busy = false;
+    }
+
+    show(dataObj, img, decoded) {
+        const li = this.list.firstElementChild;  // The oldest item
+        const old = li.querySelector("img");
+        const a = li.querySelector("a");
+
+        img.hidden = !decoded;
+        li.replaceChild(img, old);
+        a.href = dataObj.url;
+        a.textContent = caption(dataObj);
+        li.hidden = false;
+        this.list.appendChild(li);  // Moves the node, nothing is created
+
+        // Drop the old image data so the spare holds nothing until reused
+        old.removeAttribute("src");
+        this.spare = old;
+    }
+}
+
+function logStats() {
+    let frames = [];
+    let last = performance.now();
+    function frame(now) {
+        frames.push(now - last);
+        last = now;
+        requestAnimationFrame(frame);
+    }
+    requestAnimationFrame(frame);
+
+    setInterval(() => {
+        const sorted = frames.sort((a, b) => a - b);
+        frames = [];
+        const p = (q) => sorted[Math.min(sorted.length - 1, Math.floor(q * sorted.length))] || 0;
+        // performance.memory only exists in Chromium
+        const heap = performance.memory ? `${(performance.memory.usedJSHeapSize / 1048576).toFixed(1)}MB` : "n/a";
+        console.info(
+            `frame p50 ${p(0.5).toFixed(1)}ms p99 ${p(0.99).toFixed(1)}ms,`
+            + ` ${document.getElementsByTagName("*").length} nodes, JS heap ${heap}`
+        );
+    }, 60000);
+}